@@ -1,21 +1,42 @@
-from flask import Flask, request, render_template, jsonify, send_from_directory, redirect, url_for, flash
+from flask import Flask, request, render_template, jsonify, send_from_directory, redirect, url_for, flash, Response, stream_with_context, make_response
 import os
 import json
-import datetime #unused
+import time
+import logging
+import datetime
+from itertools import chain
 from bs4 import BeautifulSoup
 from werkzeug.utils import secure_filename
 # CUSTOM MODULES
-from preprocessors import TextIn
-from wave_gen import KokoroGenerator, tts_queue
+from wave_gen import KokoroGenerator, worker_pool, stream_speech, SAMPLE_RATE
+from job_store import jobs
+from scheduler import scheduler
+import metrics
+from manifest import TaskScratch
+from wav_stream import follow_wav, wav_header, STREAMING_DATA_SIZE
+from encoders import encode_stream, parse_flag
 # END CUSTOM MODULES
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
+
+# Start the TTS worker processes that render queued jobs
+worker_pool.start()
 
 # Set upload folder and ensure it exists
 UPLOAD_FOLDER = 'uploads'
 PROCESSED_FOLDER = 'clean_text'
 AUDIO_FOLDER = 'audio'
 TXT_DONE_FOLDER = 'txt_done'
+# Longest text /tts/stream speaks, it is meant for previews rather than books
+STREAM_MAX_CHARS = int(os.environ.get('TTS_STREAM_MAX_CHARS', 20000))
+STREAM_MIMETYPES = {
+    'wav': 'audio/wav',
+    # Raw little-endian samples, audio/L16 would declare them big-endian (RFC 2586)
+    'pcm': 'application/octet-stream',
+    'ogg': 'audio/ogg',
+    'opus': 'audio/ogg'
+}
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
@@ -69,8 +90,8 @@ def welcome():
                 "voice": voice
             }
 
-            tts_task = KokoroGenerator(config)
-            tts_queue.put(tts_task)
+            KokoroGenerator(config)  # validates the config before it is stored
+            scheduler.submit(config)
 
             return render_template('success.html', title='SUCCESS', message="Task added to queue.")
         except Exception as e:
@@ -108,7 +129,10 @@ def process_file():
     author = request.form.get('author', '').strip()
     intro = request.form.get('intro', '').strip()
     outtro = request.form.get('outtro', '').strip()
-    chapters_per_file = int(request.form.get('chapters_per_file', '1').strip())
+    try:
+        chapters_per_file = int(request.form.get('chapters_per_file', '1').strip())
+    except ValueError:
+        return render_template('error.html', title="ERROR", error="Chapters per file must be a number.")
 
     if not title or not author:
         return render_template('error.html', title="ERROR", error="Both title and author fields are required.")
@@ -116,23 +140,25 @@ def process_file():
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
     file.save(filepath)
 
+    # TextIn runs on a worker, the request only stores the job
+    config = {
+        'filename': filepath,
+        'start': 1,
+        'end': 999,
+        'skiplinks': True,
+        'customwords': 'custom_words.txt',
+        'title': title,
+        'author': author,
+        'chapters_per_file': chapters_per_file,
+        'intro': intro,
+        'outtro': outtro,
+        'priority': 'high'  # takes seconds and the book's TTS jobs wait for it
+    }
     try:
-        text_processor = TextIn(
-            source=filepath,
-            start=1,
-            end=999,
-            skiplinks=True,
-            debug=False,
-            customwords='custom_words.txt',
-            title=title,
-            author=author,
-            chapters_per_file=chapters_per_file,
-            intro=intro,       # Pass intro
-            outtro=outtro      # Pass outtro
-        )
-        return render_template('success.html', title='SUCCESS', message="File processed successfully.", output_folder=PROCESSED_FOLDER)
+        job_id = scheduler.submit(config, kind='ingest')
     except Exception as e:
         return render_template('error.html', title='ERROR', error=str(e))
+    return job_submitted(job_id, 'ingest', f"{file.filename} is being processed, its parts will appear under Cleaned Text.")
 
 
 # Route to display available items in the clean_text directory
@@ -207,21 +233,35 @@ def generate_tts():
     extra_args = {k: v for k, v in zip(extra_keys, extra_values) if k.strip()}
     config.update(extra_args)
 
-    try:
-        # Create generator and run
-        tts_generator = KokoroGenerator(config)
-        tts_generator.generate_wav()
-
-        # Move output to AUDIO_FOLDER
-        output_file = os.path.splitext(filepath)[0] + ".wav"
-        final_path = os.path.join(app.config['AUDIO_FOLDER'], os.path.basename(output_file))
-        os.makedirs(app.config['AUDIO_FOLDER'], exist_ok=True)
-        os.rename(output_file, final_path)
+    # Asked for right away, so it goes ahead of the regular queue unless the form says otherwise
+    config.setdefault('priority', 'high')
 
-        return render_template('success.html', title='SUCCESS', message="TTS audio generated successfully.", file=final_path, model=model)
-    
+    try:
+        KokoroGenerator(config)  # validates the config before it is stored
+    except ValueError as e:
+        return render_template('error.html', title='ERROR', error=str(e)), 400
+    try:
+        job_id = scheduler.submit(config)
     except Exception as e:
         return render_template('error.html', title='ERROR', error=str(e))
+    return job_submitted(job_id, 'tts', f"TTS for {filename} has started, the audio will appear under Audio when it is done.")
+
+def job_submitted(job_id, kind, message):
+    """
+    202 response for a job that was stored for the workers: the job id and its status URL,
+    as JSON for API clients and as a page for the forms.
+    """
+    status_url = url_for('job_status', job_id=job_id)
+    if request.accept_mimetypes.best == 'application/json':
+        response = jsonify({'job_id': job_id, 'kind': kind, 'status_url': status_url})
+    else:
+        response = make_response(render_template(
+            'success.html', title='SUCCESS', message=message,
+            details=[f"Job {job_id}, status: {status_url}"]
+        ))
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
 
 @app.route('/add-to-queue', methods=['POST'])
 def add_to_queue():
@@ -255,11 +295,13 @@ def add_to_queue():
         extra_args = {k: v for k, v in zip(extra_keys, extra_values) if k.strip()}
         config.update(extra_args)
 
-        # Create TTS task and enqueue it
-        tts_task = KokoroGenerator(config)
-        tts_queue.put(tts_task)
+        # Store the TTS job, a worker picks it up from the job store
+        KokoroGenerator(config)  # validates the config before it is stored
+        scheduler.submit(config)
 
         return render_template('success.html', title='SUCCESS', message="Task added to queue.")
+    except ValueError as e:
+        return render_template('error.html', title='ERROR', error=str(e)), 400
     except Exception as e:
         return render_template('error.html', title='ERROR', error=str(e))
 
@@ -306,8 +348,8 @@ def generate_tts_all():
         config.update(extra_args)
 
         try:
-            tts_task = KokoroGenerator(config)
-            tts_queue.put(tts_task)
+            KokoroGenerator(config)  # validates the config before it is stored
+            scheduler.submit(config)
             queued_files.append(filename)
         except Exception as e:
             logger.error(f"Failed to queue file {filename}: {e}")
@@ -319,22 +361,120 @@ def generate_tts_all():
         details=queued_files
     )
     
+def format_eta(timestamp):
+    if timestamp is None:
+        return ''
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M')
+
+# Seconds without a progress update after which a running job is flagged as stalled
+STALL_AFTER = 300
+
+def queue_snapshot():
+    """
+    Running, waiting and recently failed jobs with their progress and estimates.
+    Read from the job store, so polling it never blocks a worker.
+    """
+    running_jobs = jobs.by_state('running')
+    progress = jobs.progress(job['id'] for job in running_jobs)
+    queued_jobs, eta = scheduler.forecast(worker_pool.size, progress=progress)
+    now = time.time()
+
+    return {
+        'running': [queue_item(job, eta, progress, now) for job in running_jobs],
+        'queued': [queue_item(job, eta, progress, now) for job in queued_jobs],
+        'failed': [queue_item(job, eta, progress, now) for job in jobs.by_state('failed', limit=20, newest_first=True)]
+    }
+
+def queue_item(job, eta, progress, now):
+    """
+    What the queue page and the status endpoints show of a job.
+    """
+    config = job['config']
+    start, finish = eta.get(job['id'], (None, None))
+    item = {
+        'id': job['id'],
+        'kind': job['kind'],
+        'worker': job['worker'],
+        'filename': os.path.basename(config['filename']),
+        'file_path': config['filename'],
+        'author': config.get('author', ''),
+        'title': config.get('title', ''),
+        'model': config.get('model', ''),
+        'priority': config.get('priority') or 'normal',
+        'estimated_start': format_eta(start),
+        'estimated_finish': format_eta(finish),
+        'attempts': job['attempts'],
+        'error': job['error'],
+        'progress': None
+    }
+    if job['id'] in progress:
+        p = progress[job['id']]
+        item['progress'] = {
+            'stage': p['stage'],
+            'chunks_done': p['chunks_done'],
+            'chunks_total': p['chunks_total'],
+            'percent': round(100 * p['chunks_done'] / p['chunks_total'], 1) if p['chunks_total'] else 0.0,
+            'audio_seconds': round(p['audio_seconds'], 1),
+            'rtf': round(p['rtf'], 3) if p['rtf'] is not None else None,
+            'retries': p['retries'],
+            'updated_at': p['updated_at'],
+            'stalled': job['state'] == 'running' and now - p['updated_at'] > STALL_AFTER
+        }
+    return item
+
 @app.route('/current-queue', methods=['GET'])
 def current_queue():
     """
     Display the current items in the TTS queue.
     """
-    queue_items = []
-    with tts_queue.mutex:
-        for task in list(tts_queue.queue):
-            queue_items.append({
-                'file_path': task.file_path,
-                'author': task.author,
-                'title': task.title,
-                'model': task.model
-            })
-
-    return render_template('queue.html', title="Current TTS Queue", queue_items=queue_items)
+    snapshot = queue_snapshot()
+    return render_template('queue.html', title="Current TTS Queue", queue_items=snapshot['queued'], running_items=snapshot['running'], failed_items=snapshot['failed'])
+
+@app.route('/current-queue/status', methods=['GET'])
+def current_queue_status():
+    """
+    The queue with live progress as JSON. Carries an ETag, so pollers get a bodiless 304 until something changed.
+    """
+    response = jsonify(queue_snapshot())
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    State, progress and estimates of one TTS or ingest job as JSON, with an ETag like the queue status.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Job {job_id} not found"}), 404
+
+    eta, progress = {}, jobs.progress([job_id])
+    if job['state'] in ('queued', 'running'):
+        running_progress = jobs.progress(running['id'] for running in jobs.by_state('running'))
+        _, eta = scheduler.forecast(worker_pool.size, progress=running_progress)
+
+    status = queue_item(job, eta, progress, time.time())
+    status.update({
+        'state': job['state'],
+        'output_path': job['output_path'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    })
+    response = jsonify(status)
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Metrics of the app and all worker processes in the Prometheus text format.
+    """
+    counts = jobs.counts()
+    metrics.queue_depth.set(counts.get('queued', 0))
+    metrics.workers.set(worker_pool.size)
+    metrics.workers_busy.set(counts.get('running', 0))
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 # Route to display available items in the tts audio directory
 @app.route('/audio', methods=['GET'])
@@ -358,6 +498,77 @@ def play_audio_file(filename):
     # Serve the file inline without forcing a download
     return send_from_directory(AUDIO_FOLDER, filename)
 
+@app.route('/audio/live/<filename>', methods=['GET'])
+def live_audio_file(filename):
+    """
+    Streams the already assembled part of a file that is still rendering,
+    then keeps sending new audio as it is synthesized.
+    """
+    live_path = TaskScratch.find_output(secure_filename(filename))
+    if not live_path:
+        return jsonify({"error": "No render in progress for this file."}), 404
+    response = Response(stream_with_context(follow_wav(live_path)), mimetype='audio/wav')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@app.route('/tts/stream', methods=['GET', 'POST'])
+def stream_tts():
+    """
+    Speaks a text with a voice and streams the audio back as it is synthesized, to preview
+    voices and pronunciations without queuing a render. Parameters come from the query
+    string, the form or a JSON body: text, voice, speed, format (wav, pcm, ogg or opus)
+    and customwords (false skips the pronunciation lexicon). pcm is headerless signed
+    16-bit little-endian mono at SAMPLE_RATE.
+    """
+    started = time.perf_counter()
+    params = request.get_json(silent=True) or request.values
+    text = str(params.get('text', '')).strip()
+    voice = str(params.get('voice') or 'bf_emma').strip()
+    output_format = str(params.get('format') or 'wav').strip().lower()
+
+    if not text:
+        return jsonify({"error": "text is required."}), 400
+    if len(text) > STREAM_MAX_CHARS:
+        return jsonify({"error": f"text is longer than {STREAM_MAX_CHARS} characters, queue a render instead."}), 413
+    if output_format not in STREAM_MIMETYPES:
+        return jsonify({"error": f"format must be one of {', '.join(STREAM_MIMETYPES)}."}), 400
+    try:
+        speed = float(params.get('speed', 1))
+        if speed <= 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({"error": "speed must be a positive number."}), 400
+
+    audio = stream_speech(
+        text, voice, speed,
+        customwords=parse_flag(params.get('customwords', True)),
+        started=started
+    )
+    # The first chunk is synthesized before answering, so a failure is still an error response
+    try:
+        first = next(audio, None)
+    except Exception as e:
+        logger.error(f"Streaming TTS failed: {e}")
+        return jsonify({"error": str(e)}), 500
+    if first is None:
+        return jsonify({"error": "text has nothing to speak."}), 400
+    audio = chain([first], audio)
+
+    if output_format == 'wav':
+        body = chain([wav_header(STREAMING_DATA_SIZE, SAMPLE_RATE)], audio)
+    elif output_format == 'pcm':
+        body = audio
+    else:
+        body = encode_stream(audio, SAMPLE_RATE, output_format)
+    response = Response(stream_with_context(body), mimetype=STREAM_MIMETYPES[output_format])
+    response.headers['Cache-Control'] = 'no-store'
+    if output_format == 'pcm':
+        response.headers['X-Audio-Format'] = f'pcm_s16le;rate={SAMPLE_RATE};channels=1'
+    # Proxies would otherwise hold the audio back until the response is complete
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 
 @app.route('/edit/<filename>', methods=['GET'])
 def edit_text(filename):
@@ -378,7 +589,7 @@ def save_text(filename):
     try:
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write(content)
-        return render_template('success.html', title='SUCCESS', message='File saved successfully.')
+        return render_template('success.html', title='SUCCESS', message='File saved successfully. Generate its audio again to apply the changes, only the edited passages are synthesized.')
     except Exception as e:
         return render_template('error.html', title='ERROR', error=str(e))
 
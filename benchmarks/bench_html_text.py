@@ -0,0 +1,125 @@
+'''
+Compares the lxml chap2text backend with the BeautifulSoup reference.
+
+First checks that both extract identical text from the chapters of a
+generated EPUB and from randomized XHTML documents mixing the markup
+chap2text treats specially (anchors, footnote numbers, blacklisted parents,
+comments, entities), then times both on EPUBs of growing size.
+
+    python benchmarks/bench_html_text.py --chapters 1,8,60
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import ebooklib  # noqa: E402
+from ebooklib import epub  # noqa: E402
+
+import fixtures  # noqa: E402
+from html_text import html_to_text  # noqa: E402
+
+TEXT = ["word", " ", "  \n ", "12", " 3 ", "&nbsp;", "&amp;", "&#160;", "&eacute;", "&lt;b&gt;", "é", "Mr. Smith", "\xa0", "x"]
+TAGS = [
+    "p", "div", "span", "em", "b", "h1", "section", "svg", "epub:switch", "title", "header", "noscript",
+    "a", 'a href="#n1"', 'a href=""', 'a href="chap_0002.xhtml"',
+]
+# Only ever hold text in real documents, html.parser reads their content raw
+RAW_TAGS = ["script", "style"]
+DOCTYPE = '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.1//EN" "http://www.w3.org/TR/xhtml11/DTD/xhtml11.dtd">'
+
+
+def random_markup(rng, depth=0):
+    out = []
+    for _ in range(rng.randint(0, 4)):
+        roll = rng.random()
+        if roll < 0.45 or depth > 4:
+            out.append(rng.choice(TEXT))
+        elif roll < 0.55:
+            out.append(f"<!--{rng.choice(TEXT)}-->")
+        elif roll < 0.6:
+            out.append("<br/>")
+        elif roll < 0.65:
+            tag = rng.choice(RAW_TAGS)
+            out.append(f"<{tag}>{rng.choice(TEXT)}</{tag}>")
+        else:
+            tag = rng.choice(TAGS)
+            out.append(f"<{tag}>{random_markup(rng, depth + 1)}</{tag.split()[0]}>")
+    return "".join(out)
+
+
+def random_document(rng):
+    head = f"<head><title>{random_markup(rng, 3)}</title><style>p {{ margin: 0 }}</style>{random_markup(rng, 4)}</head>"
+    return (
+        f'<?xml version="1.0" encoding="utf-8"?>{DOCTYPE}'
+        f'<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+        f"{head}<body>{random_markup(rng)}</body></html>"
+    ).encode("utf-8")
+
+
+def epub_documents(workdir, chapters, words_per_chapter):
+    path = fixtures.build_epub(os.path.join(workdir, f"bench_{chapters}.epub"), chapters, words_per_chapter)
+    book = epub.read_epub(path)
+    return [item.get_content() for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT)]
+
+
+def check(documents, samples, seed=0):
+    rng = random.Random(seed)
+    cases = list(documents) + [random_document(rng) for _ in range(samples)]
+    for case in cases:
+        for skiplinks in (True, False):
+            expected = html_to_text(case, skiplinks, "bs4")
+            actual = html_to_text(case, skiplinks, "lxml")
+            if expected != actual:
+                raise AssertionError(f"skiplinks={skiplinks} differs for {case!r}:\n  bs4  {expected!r}\n  lxml {actual!r}")
+    return len(cases)
+
+
+def timed(documents, backend, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for document in documents:
+            html_to_text(document, False, backend)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", default="1,8,60", help="comma separated EPUB sizes in chapters")
+    parser.add_argument("--words-per-chapter", type=int, default=4000)
+    parser.add_argument("--samples", type=int, default=20000, help="randomized equivalence cases")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    # bs4 warns about parsing XHTML with html.parser, which is the reference behaviour here
+    warnings.filterwarnings("ignore", module="bs4")
+
+    with tempfile.TemporaryDirectory(prefix="narrator-bench-") as workdir:
+        cases = check(epub_documents(workdir, 4, 500), args.samples)
+        print(json.dumps({"benchmark": "html_text", "check": "identical", "cases": cases}), flush=True)
+
+        for chapters in (int(size) for size in args.chapters.split(",")):
+            documents = epub_documents(workdir, chapters, args.words_per_chapter)
+            bs4_seconds = timed(documents, "bs4", args.repeat)
+            lxml_seconds = timed(documents, "lxml", args.repeat)
+            print(json.dumps({
+                "benchmark": "html_text",
+                "chapters": chapters,
+                "bytes": sum(len(document) for document in documents),
+                "bs4_seconds": round(bs4_seconds, 4),
+                "lxml_seconds": round(lxml_seconds, 4),
+                "speedup": round(bs4_seconds / lxml_seconds, 2),
+            }), flush=True)
+
+
+if __name__ == "__main__":
+    main()
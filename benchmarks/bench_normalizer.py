@@ -0,0 +1,89 @@
+'''
+Compares TextNormalizer with the chained-replace cleaner it replaced.
+
+First checks that both produce identical output on the benchmark fixtures and
+on randomized strings built from every character and token the cleaning
+steps treat specially, then times prep_text on books of growing size.
+
+    python benchmarks/bench_normalizer.py --words 20000,200000,1000000
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import fixtures  # noqa: E402
+from legacy_text import LegacyTextIn  # noqa: E402
+from text_normalizer import TextNormalizer  # noqa: E402
+
+# Pieces that interact across the cleaning steps
+TOKENS = [
+    "Mr.", "Mrs.", "Ms.", "St.", "Mr", "Mr.\n", "5", "21", "007", "st", "nd", "rd", "th", " th",
+    "’", "‘", "“", "”", "—", "–", "-", "--", ";", ":", "'", "''", "◇", ".", "\xa0", "\xa0.\xa0.\xa0. ", "...", "... ", "…",
+    "«", "»", "‹", "›", "[", "]", "&", "GNU", " GNU ", "*", "•", " ", "￥", "ﬁ", "Ａ", "①",
+    "\n", "\r\n", " ", " ", "  ", "\t", "!", "?", ",", "Wizarding Wireless America",
+    "the", "The", "A", "book", "é", "日本", "_", "x", "Ⅻ", "٣",
+]
+
+
+def random_text(rng, length):
+    return "".join(rng.choice(TOKENS) for _ in range(length))
+
+
+def check(legacy, compiled, samples, seed=0):
+    rng = random.Random(seed)
+    cases = [fixtures.synthetic_text(2000, seed=n) for n in range(5)]
+    cases += [random_text(rng, rng.randint(1, 60)) for _ in range(samples)]
+    for case in cases:
+        for name in ("expand_abbreviations", "expand_ordinals", "normalize_unicode_to_ascii", "prep_text"):
+            expected = getattr(legacy, name)(case)
+            actual = getattr(compiled, name)(case)
+            if expected != actual:
+                raise AssertionError(f"{name} differs for {case!r}:\n  legacy   {expected!r}\n  compiled {actual!r}")
+    return len(cases)
+
+
+def timed(func, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", default="20000,200000,1000000", help="comma separated book sizes in words")
+    parser.add_argument("--samples", type=int, default=20000, help="randomized equivalence cases")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    legacy = LegacyTextIn()
+    compiled = TextNormalizer()
+    cases = check(legacy, compiled, args.samples)
+    print(json.dumps({"benchmark": "normalizer", "check": "identical", "cases": cases}), flush=True)
+
+    for words in (int(size) for size in args.words.split(",")):
+        text = fixtures.synthetic_text(words)
+        assert legacy.prep_text(text) == compiled.prep_text(text)
+        legacy_seconds = timed(legacy.prep_text, text, args.repeat)
+        compiled_seconds = timed(compiled.prep_text, text, args.repeat)
+        print(json.dumps({
+            "benchmark": "normalizer",
+            "words": words,
+            "chars": len(text),
+            "legacy_seconds": round(legacy_seconds, 4),
+            "compiled_seconds": round(compiled_seconds, 4),
+            "speedup": round(legacy_seconds / compiled_seconds, 2),
+        }), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+'''
+End-to-end benchmark of the text-to-WAV pipeline with a stub TTS model.
+
+Builds deterministic fixtures per size and times every stage in a fresh
+process, so each result carries that stage's own peak RSS:
+
+    ingest      TextIn on an EPUB (chap2text, prep_text, apply_customwords, part files)
+    ingest_lazy the same with lazy=True: spine streamed from the zip, parts written as they fill
+    normalize   prep_text and apply_customwords on plain text
+    tokenize    trained Punkt sentence splitting and phoneme-budget chunk packing
+    assemble    generate_wav with the stub pipeline: chunk cache, streaming WAV writer, finalize
+    production  ProductionWav with intro/outro overlays at the cd profile
+
+Prints one JSON object per stage and size.
+
+    python benchmarks/bench_pipeline.py --sizes chapter,book
+    python benchmarks/bench_pipeline.py --sizes omnibus --stages ingest,normalize,tokenize
+'''
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fixtures  # noqa: E402
+import stub_pipeline  # noqa: E402
+
+SIZES = {"chapter": 1, "book": 8, "omnibus": 60}  # chapters
+STAGES = ["ingest", "ingest_lazy", "normalize", "tokenize", "assemble", "production"]
+BOOK = "bench"
+
+
+def peak_rss_mb():
+    # ru_maxrss survives exec on Linux, so a spawned child would report its parent's peak
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def stage_ingest(workdir, options, lazy=False):
+    from preprocessors import TextIn
+
+    shutil.rmtree("clean_text", ignore_errors=True)
+    start = time.perf_counter()
+    TextIn(
+        source=os.path.join(workdir, f"{BOOK}.epub"), start=1, end=999, skiplinks=True, debug=False,
+        title="Bench", author="Bench", chapters_per_file=options["chapters_per_file"],
+        customwords=os.path.join(REPO_DIR, "custom_words.txt"),
+        customphonemes=os.path.join(REPO_DIR, "custom_phonemes.txt"),
+        lazy=lazy
+    )
+    elapsed = time.perf_counter() - start
+    return {"wall_seconds": elapsed, "parts": len(os.listdir("clean_text"))}
+
+
+def stage_ingest_lazy(workdir, options):
+    return stage_ingest(workdir, options, lazy=True)
+
+
+def stage_normalize(workdir, options):
+    from preprocessors import TextIn
+
+    raw = read(os.path.join(workdir, "raw.txt"))
+    processor = TextIn(
+        source="raw.txt", start=1, end=999, skiplinks=True, debug=False, title="Bench", author="Bench",
+        customwords=os.path.join(REPO_DIR, "custom_words.txt"),
+        customphonemes=os.path.join(REPO_DIR, "custom_phonemes.txt")
+    )
+    start = time.perf_counter()
+    text = processor.prep_text(raw)
+    prepared = time.perf_counter()
+    processor.apply_customwords(text)
+    done = time.perf_counter()
+    return {
+        "wall_seconds": done - start,
+        "prep_text_seconds": prepared - start,
+        "apply_customwords_seconds": done - prepared,
+    }
+
+
+def stage_tokenize(workdir, options):
+    stub_pipeline.ensure_kokoro()
+    from chunker import estimate_phonemes
+    from wave_gen import KokoroGenerator
+
+    task = KokoroGenerator(generator_config(workdir))
+    start = time.perf_counter()
+    sentences = list(task.chunker.sentences(task.extract_text()))
+    tokenized = time.perf_counter()
+    chunks = task.iter_chunks()
+    first = [next(chunks)]
+    first_chunk = time.perf_counter()
+    chunks = first + list(chunks)
+    done = time.perf_counter()
+    phonemes = [estimate_phonemes(chunk) for chunk in chunks]
+    return {
+        # The chunker runs punkt again as it streams, so this is one full chunking pass
+        "wall_seconds": done - tokenized,
+        "punkt_seconds": tokenized - start,
+        "first_chunk_seconds": first_chunk - tokenized,
+        "sentences": len(sentences),
+        "chunks": len(chunks),
+        "mean_phonemes": round(sum(phonemes) / len(phonemes), 1),
+        "max_phonemes": max(phonemes),
+    }
+
+
+def stage_assemble(workdir, options):
+    stub_pipeline.ensure_kokoro()
+    import wave_gen
+
+    stub_pipeline.install(wave_gen.pipelines, options["seconds_per_char"])
+    config = generator_config(workdir)
+    config["batch_size"] = options["batch_size"]
+    start = time.perf_counter()
+    output_path = wave_gen.KokoroGenerator(config).generate_wav()
+    elapsed = time.perf_counter() - start
+    audio_seconds = audio_length(output_path)
+    return {"wall_seconds": elapsed, "audio_seconds": round(audio_seconds, 1), "realtime_factor": round(audio_seconds / elapsed, 1)}
+
+
+def stage_production(workdir, options):
+    from postprocessor import ProductionWav
+
+    narration = os.path.join(workdir, "narration.wav")
+    config = {
+        "intro": os.path.join(workdir, "intro.wav"),
+        "outro": os.path.join(workdir, "outro.wav"),
+        "resampler": options["resampler"],
+    }
+    start = time.perf_counter()
+    output_path = ProductionWav(narration, config).output_path
+    elapsed = time.perf_counter() - start
+    audio_seconds = audio_length(narration)
+    os.remove(output_path)
+    return {"wall_seconds": elapsed, "audio_seconds": round(audio_seconds, 1), "realtime_factor": round(audio_seconds / elapsed, 1)}
+
+
+def generator_config(workdir):
+    return {
+        "filename": os.path.join(workdir, f"{BOOK}_clean.txt"),
+        "title": "Bench", "author": "Bench", "model": "kokoro", "voice": "af_heart",
+    }
+
+
+def audio_length(path):
+    import soundfile as sf
+    info = sf.info(path)
+    return info.frames / info.samplerate
+
+
+def run_stage(stage, workdir, options):
+    '''
+        Runs in a fresh process: isolated from the job store, cache and metrics of a
+        real installation, and its peak RSS belongs to this stage alone.
+    '''
+    os.chdir(workdir)
+    os.environ["TTS_JOB_DB"] = os.path.join(workdir, "jobs.db")
+    os.environ["TTS_CACHE_DIR"] = os.path.join(workdir, "chunk_cache")
+    os.environ["TTS_METRICS_DIR"] = os.path.join(workdir, "metrics")
+    import logging
+    logging.disable(logging.INFO)
+
+    result = globals()[f"stage_{stage}"](workdir, options)
+    for key, value in result.items():
+        if key.endswith("_seconds"):
+            result[key] = round(value, 4)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def build_fixtures(workdir, chapters, options):
+    '''
+        Writes the inputs of every stage, untimed.
+    '''
+    fixtures.ensure_dir(workdir)
+    words = chapters * options["words_per_chapter"]
+    fixtures.build_epub(os.path.join(workdir, f"{BOOK}.epub"), chapters, options["words_per_chapter"])
+    text = fixtures.synthetic_text(words)
+    with open(os.path.join(workdir, "raw.txt"), "w", encoding="utf-8") as f:
+        f.write(text)
+    # Roughly what TextIn leaves for the TTS stages
+    with open(os.path.join(workdir, f"{BOOK}_clean.txt"), "w", encoding="utf-8") as f:
+        f.write(text.replace("“", '"').replace("”", '"').replace("’", "'").replace("—", ","))
+
+    if "production" in options["stages"]:
+        from wav_stream import WavStreamWriter, to_pcm16
+        pipeline = stub_pipeline.StubPipeline(seconds_per_char=options["seconds_per_char"])
+        with WavStreamWriter(os.path.join(workdir, "narration.wav"), stub_pipeline.SAMPLE_RATE) as writer:
+            for paragraph in text.split("\n\n"):
+                writer.write(to_pcm16(pipeline.audio(paragraph)))
+        fixtures.overlay_wav(os.path.join(workdir, "intro.wav"), 20)
+        fixtures.overlay_wav(os.path.join(workdir, "outro.wav"), 15, frequency=330.0)
+    return len(text)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="chapter,book", help=f"comma separated, from {', '.join(SIZES)}")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma separated subset of the stages")
+    parser.add_argument("--words-per-chapter", type=int, default=4000)
+    parser.add_argument("--chapters-per-file", type=int, default=1)
+    parser.add_argument("--seconds-per-char", type=float, default=stub_pipeline.SECONDS_PER_CHAR,
+                        help="audio the stub produces per character of text")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--resampler", default="polyphase")
+    parser.add_argument("--workdir", help="where fixtures and outputs go, a temporary directory by default")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    args = parser.parse_args()
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    for name in sizes:
+        if name not in SIZES:
+            parser.error(f"unknown size '{name}'")
+    for name in stages:
+        if name not in STAGES:
+            parser.error(f"unknown stage '{name}'")
+
+    options = {
+        "stages": stages,
+        "words_per_chapter": args.words_per_chapter,
+        "chapters_per_file": args.chapters_per_file,
+        "seconds_per_char": args.seconds_per_char,
+        "batch_size": args.batch_size,
+        "resampler": args.resampler,
+    }
+    root = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="narrator-bench-")
+    commit = git_commit()
+    context = mp.get_context("spawn")
+
+    try:
+        for size in sizes:
+            workdir = os.path.join(root, size)
+            chars = build_fixtures(workdir, SIZES[size], options)
+            for stage in stages:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_stage, stage, workdir, options).result()
+                record = {"benchmark": "pipeline", "stage": stage, "size": size, "chapters": SIZES[size], "chars": chars}
+                record.update(result)
+                record["commit"] = commit
+                print(json.dumps(record), flush=True)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+'''
+Throughput benchmark for the export_final resamplers.
+
+Streams synthetic 24 kHz mono narration through each resampler in the same
+block size ProductionWav uses and reports audio-seconds per wall-second.
+
+    python benchmarks/bench_resample.py --minutes 10
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from postprocessor import BLOCK_FRAMES, RESAMPLERS  # noqa: E402
+from wav_stream import to_pcm16  # noqa: E402
+
+IN_RATE = 24000
+
+
+def narration(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((int(seconds * IN_RATE), 1)) * 0.1).astype(np.float32)
+
+
+def run(name, audio, out_rate, out_channels):
+    start = time.perf_counter()
+    frames = 0
+    if name == "native":
+        # Passthrough: only the int16 conversion ProductionWav still does
+        for pos in range(0, len(audio), BLOCK_FRAMES):
+            block = audio[pos:pos + BLOCK_FRAMES]
+            to_pcm16(block)
+            frames += len(block)
+    else:
+        resampler = RESAMPLERS[name](IN_RATE, out_rate, audio.shape[1])
+        for pos in range(0, len(audio), BLOCK_FRAMES):
+            block = resampler.process(audio[pos:pos + BLOCK_FRAMES], final=pos + BLOCK_FRAMES >= len(audio))
+            block = np.repeat(block, out_channels, axis=1)
+            to_pcm16(block)
+            frames += len(block)
+    elapsed = time.perf_counter() - start
+    seconds = len(audio) / IN_RATE
+    return {
+        "benchmark": "resample",
+        "resampler": name,
+        "out_rate": IN_RATE if name == "native" else out_rate,
+        "audio_seconds": seconds,
+        "wall_seconds": round(elapsed, 4),
+        "realtime_factor": round(seconds / elapsed, 1),
+        "output_frames": frames,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10.0, help="length of the synthetic narration")
+    parser.add_argument("--out-rate", type=int, default=44100)
+    args = parser.parse_args()
+
+    audio = narration(args.minutes * 60)
+    for name in ["native", *RESAMPLERS]:
+        print(json.dumps(run(name, audio, args.out_rate, 2)))
+
+
+if __name__ == "__main__":
+    main()
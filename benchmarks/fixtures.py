@@ -0,0 +1,109 @@
+'''
+Deterministic inputs for the pipeline benchmarks: prose that exercises the
+text cleaners (abbreviations, ordinals, smart quotes, dashes, ellipses,
+footnote links), EPUBs built from it and overlay WAVs for ProductionWav.
+'''
+import os
+import random
+
+import numpy as np
+import soundfile as sf
+from ebooklib import epub
+
+WORDS = (
+    "the a of and to in was he she it that his her with as had for on at by but not from they "
+    "house castle letter morning window owl wand quietly suddenly remembered shadow corridor "
+    "professor student kitchen garden fire stairs journey answer question voice silence "
+    "walked looked turned whispered smiled opened closed waited listened wondered carried "
+    "dark bright old small enormous careful strange familiar golden cold warm tired"
+).split()
+NAMES = ["Mr. Dursley", "Mrs. Weasley", "Ms. Vane", "St. Mungo", "Harry", "Hermione", "Ginny", "Neville"]
+ORDINALS = ["1st", "2nd", "3rd", "4th", "11th", "21st", "22nd", "103rd"]
+
+
+def sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 24))]
+    roll = rng.random()
+    if roll < 0.15:
+        words.insert(0, rng.choice(NAMES))
+    elif roll < 0.25:
+        words.insert(rng.randint(0, len(words)), f"the {rng.choice(ORDINALS)}")
+    text = " ".join(words)
+    text = text[0].upper() + text[1:]
+
+    roll = rng.random()
+    if roll < 0.2:
+        return f"“{text}!” {rng.choice(NAMES)} said."
+    if roll < 0.3:
+        return f"{text} — or so it seemed."
+    if roll < 0.35:
+        return f"{text}... and then nothing."
+    if roll < 0.4:
+        return f"It wasn’t {text.lower()}; not yet."
+    return text + rng.choice([".", ".", ".", "?", "!"])
+
+
+def paragraphs(words, seed=0):
+    '''
+        Yields paragraphs until roughly the given number of words was produced.
+    '''
+    rng = random.Random(seed)
+    produced = 0
+    while produced < words:
+        paragraph = " ".join(sentence(rng) for _ in range(rng.randint(2, 7)))
+        produced += len(paragraph.split())
+        yield paragraph
+
+
+def synthetic_text(words, seed=0):
+    return "\n\n".join(paragraphs(words, seed))
+
+
+def chapter_html(number, words, seed=0):
+    body = []
+    for i, paragraph in enumerate(paragraphs(words, seed)):
+        if i % 5 == 4:
+            # Footnote reference, stripped by chap2text
+            paragraph += f' <a href="#fn{i}">{i}</a>'
+        body.append(f"<p>{paragraph}</p>")
+    return (
+        f"<html><head><title>Chapter {number}</title><style>p {{ margin: 0 }}</style></head>"
+        f"<body><h1>Chapter {number}</h1>{''.join(body)}</body></html>"
+    )
+
+
+def build_epub(path, chapters, words_per_chapter, seed=0):
+    book = epub.EpubBook()
+    book.set_identifier(f"bench-{chapters}-{words_per_chapter}-{seed}")
+    book.set_title(f"Benchmark Book ({chapters} chapters)")
+    book.set_language("en")
+    book.add_author("Benchmark")
+
+    items = []
+    for number in range(1, chapters + 1):
+        item = epub.EpubHtml(title=f"Chapter {number}", file_name=f"chap_{number:04d}.xhtml", lang="en")
+        item.content = chapter_html(number, words_per_chapter, seed + number)
+        book.add_item(item)
+        items.append(item)
+
+    book.toc = items
+    book.spine = ["nav", *items]
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    epub.write_epub(path, book)
+    return path
+
+
+def overlay_wav(path, seconds, sample_rate=44100, frequency=220.0):
+    '''
+        Writes a stereo tone with a slow tremolo, a stand-in for intro/outro music.
+    '''
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    tone = 0.3 * np.sin(2 * np.pi * frequency * t) * (0.75 + 0.25 * np.sin(2 * np.pi * 0.5 * t))
+    sf.write(path, np.stack([tone, tone], axis=1).astype(np.float32), sample_rate, subtype="PCM_16")
+    return path
+
+
+def ensure_dir(path):
+    os.makedirs(path, exist_ok=True)
+    return path
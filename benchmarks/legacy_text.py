@@ -0,0 +1,118 @@
+'''
+The text cleaning of TextIn as it was before text_normalizer.TextNormalizer,
+kept verbatim as the reference the compiled version must match byte for byte.
+'''
+import re
+import string
+import unicodedata
+
+import inflect
+
+
+class LegacyTextIn:
+    def expand_abbreviations(self, text):
+        '''
+            Expands common abbreviations in text.
+        '''
+        text = re.sub(r'\bMr\.\s', 'Mister ', text)
+        text = re.sub(r'\bMrs\.\s', 'Missus ', text)
+        text = re.sub(r'\bMs\.\s', 'Miss ', text)
+        text = re.sub(r'\bSt\.\s', 'Saint ', text)
+        return text
+    def expand_ordinals(self, text):
+        '''
+            Converts ordinal numbers (e.g., 3rd, 15th, 22nd) into their word equivalents.
+            Handles cases where there is an unintended space (e.g., "5 th" instead of "5th").
+        '''
+        p = inflect.engine()
+
+        def replace_ordinal(match):
+            number = int(match.group(1))  # Extract the numeric part
+            return p.ordinal(number)  # Convert number to words (e.g., "5th" -> "fifth")
+
+        # Fix cases where there's a space between the number and ordinal suffix
+        text = re.sub(r'\b(\d+)\s*(st|nd|rd|th)\b', replace_ordinal, text)
+
+        return text
+        
+    def prep_text(self, text):
+        '''
+        Enhanced text cleaner for TTS operations.
+        - Expands abbreviations and ordinals
+        - Removes repeated chapter titles and summaries
+        - Applies paragraph formatting
+        '''
+        # --- Expand abbreviations and ordinals ---
+        text = self.expand_abbreviations(text)
+        text = self.expand_ordinals(text)
+
+        # --- Normalize smart quotes ---
+        text = (
+            text.replace('’', "'")
+                .replace('‘', "'")
+                .replace('“', '"')
+                .replace('”', '"')
+        )
+
+        # --- Clean and replace punctuation ---
+        text = text.replace("—", ", ").replace("--", ", ").replace(";", ", ").replace(":", ", ").replace("''", ", ")
+        text = (
+            text.replace("◇", "")
+                .replace(" . . . ", ", ")
+                .replace("... ", ", ")
+                .replace("«", " ")
+                .replace("»", " ")
+                .replace("[", "")
+                .replace("]", "")
+                .replace("&", " and ")
+                .replace(" GNU ", " new ")
+                .replace("*", " ")
+                .strip()
+        )
+        text = self.normalize_unicode_to_ascii(text)
+
+        # --- Remove first line if it's the intro ---
+        lines = text.splitlines()
+        if lines and "Wizarding Wireless America" in lines[0]:
+            lines = lines[1:]  # Remove the intro line
+        text = "\n".join(lines)
+
+        # --- Remove non-allowed characters ---
+        allowed_chars = string.ascii_letters + string.digits + "-,.!?' \n"
+        text = ''.join(c for c in text if c in allowed_chars)
+
+        # --- Add paragraph breaks after sentence punctuation ---
+        text = re.sub(r'(?<=[.!?])\s+(?=[A-Z])', r'\n', text)
+
+        return text
+
+    def normalize_unicode_to_ascii(self, text: str) -> str:
+        """
+        Normalize Unicode characters to ASCII equivalents.
+        Uses NFKC normalization and additional manual replacements.
+        """
+        # Apply Unicode normalization (NFKC) to convert fullwidth and compatibility chars to ASCII
+        text = unicodedata.normalize('NFKC', text)
+
+        # Additional manual replacements if needed:
+        replacements = {
+            '“': '"',
+            '”': '"',
+            '‘': "'",
+            '’': "'",
+            '—': '-',
+            '–': '-',
+            '…': '...',
+            '•': '*',
+            '‹': '<',
+            '›': '>',
+            '«': '<<',
+            '»': '>>',
+            '￥': '¥',
+            ' ': ' ',  # non-breaking space to space
+            # Add any other you want here
+        }
+        for k, v in replacements.items():
+            text = text.replace(k, v)
+
+        return text
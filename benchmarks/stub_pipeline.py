@@ -0,0 +1,71 @@
+'''
+Deterministic stand-in for kokoro's KPipeline, so benchmarks run without
+model weights. Every chunk yields audio whose length is proportional to its
+text, sliced from a fixed noise buffer, in the same Result shape the real
+pipeline produces.
+'''
+import sys
+import types
+import zlib
+
+import numpy as np
+
+SAMPLE_RATE = 24000
+SECONDS_PER_CHAR = 0.065  # about 150 words per minute
+
+_NOISE = (np.random.default_rng(0).standard_normal(SAMPLE_RATE * 10) * 0.1).astype(np.float32)
+
+
+class StubResult:
+    def __init__(self, graphemes, audio):
+        self.graphemes = graphemes
+        self.phonemes = graphemes
+        self.audio = audio
+
+
+class StubPipeline:
+    def __init__(self, lang_code="a", repo_id=None, model=None, seconds_per_char=SECONDS_PER_CHAR):
+        self.lang_code = lang_code
+        self.seconds_per_char = seconds_per_char
+
+    def audio(self, text, voice=None, speed=1):
+        frames = max(1, int(len(text) * self.seconds_per_char / speed * SAMPLE_RATE))
+        offset = zlib.crc32(f"{text}|{voice}".encode("utf-8")) % len(_NOISE)
+        return np.resize(np.roll(_NOISE, -offset), frames)
+
+    def __call__(self, text, voice=None, speed=1, split_pattern=None, model=None):
+        import torch  # only the TTS stages pay for importing torch
+
+        if isinstance(text, str):
+            text = [text]
+        for chunk in text:
+            yield StubResult(chunk, torch.from_numpy(self.audio(chunk, voice, speed)))
+
+
+def ensure_kokoro():
+    '''
+        Registers a placeholder kokoro package when the real one is not installed,
+        wave_gen imports it at module level. The benchmarks never construct it.
+    '''
+    try:
+        import kokoro  # noqa: F401
+        return
+    except ImportError:
+        pass
+    import torch
+
+    package = types.ModuleType("kokoro")
+    pipeline = types.ModuleType("kokoro.pipeline")
+    pipeline.LANG_CODES = {"a": "American English", "b": "British English"}
+    package.KPipeline = StubPipeline
+    package.KModel = torch.nn.Module
+    package.pipeline = pipeline
+    sys.modules["kokoro"] = package
+    sys.modules["kokoro.pipeline"] = pipeline
+
+
+def install(registry, seconds_per_char=SECONDS_PER_CHAR):
+    '''
+        Makes a wave_gen PipelineRegistry hand out stub pipelines.
+    '''
+    registry.get = lambda lang_code="a": StubPipeline(lang_code, seconds_per_char=seconds_per_char)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import wave
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+CACHE_FOLDER = os.environ.get("TTS_CACHE_DIR", "chunk_cache")
+CACHE_MAX_MB = int(os.environ.get("TTS_CACHE_MAX_MB", 2048))
+
+
+class ChunkCache:
+    '''
+    Content-addressed store of synthesized chunk audio.
+    Entries are keyed by the normalized chunk text plus everything that changes
+    the rendered audio (voice, speed, model, sample rate). Least recently used
+    entries are evicted once the cache grows past max_bytes.
+    '''
+    def __init__(self, root=CACHE_FOLDER, max_bytes=CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = Lock()
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(text.split())
+
+    def key(self, text, voice, speed, model, sample_rate):
+        payload = json.dumps([self.normalize(text), voice, float(speed), model, int(sample_rate)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.wav")
+
+    def fetch(self, key):
+        '''
+            Returns the cached chunk's 16-bit PCM frames, or None on a miss.
+            A truncated or corrupt entry is removed and counts as a miss, so its chunk is synthesized again.
+        '''
+        path = self.path(key)
+        try:
+            with wave.open(path, "rb") as wf:
+                expected = wf.getnframes() * wf.getnchannels() * wf.getsampwidth()
+                frames = wf.readframes(wf.getnframes())
+            if len(frames) != expected:
+                raise EOFError(f"{len(frames)} of {expected} bytes")
+            os.utime(path)  # mark as recently used
+        except (FileNotFoundError, wave.Error, EOFError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"⚠️ Removing unreadable cached chunk {path}: {e}")
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return frames
+
+    def store(self, key, frames, sample_rate, channels=1):
+        path = self.path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with wave.open(tmp_path, "wb") as wf:
+            wf.setnchannels(channels)
+            wf.setsampwidth(2)
+            wf.setframerate(sample_rate)
+            wf.writeframes(frames)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".wav"):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue  # evicted by another worker
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Rescan, other workers share the directory; trim to 90% to avoid evicting on every store
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+            evicted += 1
+        logger.info(f"🧹 Evicted {evicted} cached chunks, cache now {self._size / 1024 / 1024:.1f} MB")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# One cache per process, shared by every task it renders
+chunk_cache = ChunkCache()
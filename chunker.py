@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import os
+import pickle
+import re
+from collections import deque
+from functools import lru_cache
+from itertools import chain
+
+import nltk
+from nltk.tokenize import PunktSentenceTokenizer
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Kokoro's context holds 510 phoneme tokens, longer input is split or clipped by the pipeline
+MODEL_PHONEMES = 510
+# Packing target, the headroom absorbs words that phonemize longer than they are spelled
+CHUNK_PHONEMES = int(os.environ.get("TTS_CHUNK_PHONEMES", 490))
+# First chunk of a stream, about a sentence so the listener hears audio quickly
+FIRST_CHUNK_PHONEMES = int(os.environ.get("TTS_STREAM_FIRST_PHONEMES", 120))
+# Trained punkt models per Kokoro lang_code, other languages use English
+PUNKT_LANGUAGES = {"a": "english", "b": "english", "e": "spanish", "f": "french", "i": "italian", "p": "portuguese"}
+
+# Digits are read as number words and capital runs letter by letter, both phonemize longer than spelled
+EXPANDING = re.compile(r"(\d+)|([A-Z]{2,})(?![a-z])|\s{2,}")
+DIGIT_PHONEMES = 5
+LETTER_PHONEMES = 3
+# Where an over-long sentence is cut: after clause punctuation first, then between words
+SPLITTERS = (re.compile(r"(?<=[,;:])\s+"), re.compile(r"\s+"))
+
+# The punkt models shipped with the app, found without NLTK_DATA set as well
+NLTK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data")
+if NLTK_DATA_DIR not in nltk.data.path:
+    nltk.data.path.append(NLTK_DATA_DIR)
+
+
+@lru_cache(maxsize=None)
+def load_punkt(language="english"):
+    '''
+        The trained punkt model shipped in nltk_data, loaded once per process.
+        Newer NLTK reads its punkt_tab tables, older data only has the pickle.
+        An untrained tokenizer is the last resort, it splits after every abbreviation.
+    '''
+    try:
+        return nltk.tokenize.PunktTokenizer(language)
+    except (AttributeError, LookupError, OSError):
+        pass
+    try:
+        with open(nltk.data.find(f"tokenizers/punkt/PY3/{language}.pickle"), "rb") as f:
+            return pickle.load(f)
+    except (LookupError, OSError, pickle.UnpicklingError) as e:
+        logger.warning(f"⚠️ No trained punkt model for {language} ({e.__class__.__name__}), using an untrained tokenizer")
+        return PunktSentenceTokenizer()
+
+
+def unit_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def estimate_phonemes(text):
+    '''
+        Approximate phoneme tokens of a text: a token per character, with number words and
+        spelled-out capitals expanded and runs of whitespace counted once.
+    '''
+    estimate = len(text)
+    for match in EXPANDING.finditer(text):
+        digits, letters = match.groups()
+        if digits:
+            estimate += (DIGIT_PHONEMES - 1) * len(digits)
+        elif letters:
+            estimate += (LETTER_PHONEMES - 1) * len(letters)
+        else:
+            estimate -= len(match.group(0)) - 1
+    return estimate
+
+
+class Chunker:
+    '''
+    Splits a text into sentences with a trained punkt model and packs them into
+    chunks of at most max_phonemes estimated phoneme tokens, so every chunk is
+    one forward pass that fills most of Kokoro's context. A sentence too long
+    for one chunk is cut at clause punctuation, then between words.
+    Chunks are produced as the text is read, the first one is ready right away.
+    Given the layout of an earlier render, runs of sentences that made up one of
+    its chunks come out as that chunk again, so an edit only changes the chunks
+    around it.
+    '''
+    def __init__(self, max_phonemes=CHUNK_PHONEMES, language="english", max_chars=None):
+        self.max_phonemes = min(int(max_phonemes), MODEL_PHONEMES)
+        self.max_chars = max_chars
+        self.tokenizer = load_punkt(language)
+
+    @classmethod
+    def for_lang_code(cls, lang_code, **kwargs):
+        return cls(language=PUNKT_LANGUAGES.get(lang_code, "english"), **kwargs)
+
+    def fits(self, chars, cost):
+        return cost <= self.max_phonemes and (self.max_chars is None or chars <= self.max_chars)
+
+    def sentences(self, text):
+        for start, end in self.tokenizer.span_tokenize(text):
+            sentence = text[start:end].strip()
+            if any(c.isalnum() for c in sentence):
+                yield sentence
+
+    def fit(self, sentence, cost, level=0):
+        '''
+            Yields (text, cost) pieces of a sentence that each fit in a chunk.
+        '''
+        if self.fits(len(sentence), cost) or level == len(SPLITTERS):
+            yield sentence, cost
+            return
+        pieces = [piece for piece in SPLITTERS[level].split(sentence) if piece]
+        for piece, piece_cost, _ in self.pack((piece, estimate_phonemes(piece)) for piece in pieces):
+            yield from self.fit(piece, piece_cost, level + 1)
+
+    def pack(self, pieces):
+        '''
+            Joins (text, cost) pieces with spaces while the chunk stays within the limits,
+            the space between two pieces counts as one token. Yields (chunk, cost, pieces used).
+        '''
+        parts, cost, chars = [], 0, 0
+        for piece, piece_cost in pieces:
+            if parts and not self.fits(chars + 1 + len(piece), cost + 1 + piece_cost):
+                yield " ".join(parts), cost, len(parts)
+                parts, cost, chars = [], 0, 0
+            elif parts:
+                cost, chars = cost + 1, chars + 1
+            parts.append(piece)
+            cost, chars = cost + piece_cost, chars + len(piece)
+        if parts:
+            yield " ".join(parts), cost, len(parts)
+
+    def units(self, text):
+        '''
+            The (text, cost) pieces chunks are packed from: sentences, or parts of the long ones.
+        '''
+        for sentence in self.sentences(text):
+            yield from self.fit(sentence, estimate_phonemes(sentence))
+
+    def layout(self, text, previous=()):
+        '''
+            Yields (chunk, unit hashes) pairs. previous holds the unit hashes of the chunks of an
+            earlier layout: where the same units follow each other again they form the same
+            chunk, the units in between are packed anew.
+        '''
+        units = self.units(text)
+        if not previous:
+            for chunk, _, hashes in self.pack_units(units):
+                yield chunk, hashes
+            return
+
+        known = {}
+        for hashes in previous:
+            if hashes:
+                known.setdefault(hashes[0], set()).add(tuple(hashes))
+        candidates = {first: sorted(runs, key=len, reverse=True) for first, runs in known.items()}
+
+        units = [(piece, cost, unit_hash(piece)) for piece, cost in units]
+        changed = []
+        i = 0
+        while i < len(units):
+            match = None
+            for run in candidates.get(units[i][2], ()):
+                span = units[i:i + len(run)]
+                if tuple(unit[2] for unit in span) == run:
+                    cost = sum(unit[1] for unit in span) + len(span) - 1
+                    chunk = " ".join(unit[0] for unit in span)
+                    if self.fits(len(chunk), cost):
+                        match = chunk, cost, run
+                        break
+            if match is None:
+                changed.append(units[i][:2])
+                i += 1
+                continue
+            for chunk, _, hashes in self.pack_units(changed):
+                yield chunk, hashes
+            changed = []
+            metrics.chunk_phonemes.observe(match[1])
+            yield match[0], match[2]
+            i += len(match[2])
+        for chunk, _, hashes in self.pack_units(changed):
+            yield chunk, hashes
+
+    def pack_units(self, units):
+        '''
+            pack, also returning the hashes of the units every chunk is made of.
+        '''
+        hashes = deque()
+
+        def track(units):
+            for piece, cost in units:
+                hashes.append(unit_hash(piece))
+                yield piece, cost
+
+        for chunk, cost, count in self.pack(track(units)):
+            metrics.chunk_phonemes.observe(cost)
+            # pack has already read the first unit of the next chunk
+            yield chunk, cost, tuple(hashes.popleft() for _ in range(count))
+
+    def chunks(self, text):
+        for chunk, _ in self.layout(text):
+            yield chunk
+
+    def stream(self, text, first_phonemes=FIRST_CHUNK_PHONEMES):
+        '''
+            Like chunks, but the first chunk ends after the sentence that reaches first_phonemes,
+            so the first audio of a stream is ready after a short forward pass.
+        '''
+        units = self.units(text)
+        parts, cost, chars = [], -1, -1
+        for piece, piece_cost in units:
+            if parts and (cost >= first_phonemes or not self.fits(chars + 1 + len(piece), cost + 1 + piece_cost)):
+                units = chain([(piece, piece_cost)], units)
+                break
+            parts.append(piece)
+            cost, chars = cost + 1 + piece_cost, chars + 1 + len(piece)
+        if parts:
+            metrics.chunk_phonemes.observe(cost)
+            yield " ".join(parts)
+        for chunk, cost, _ in self.pack(units):
+            metrics.chunk_phonemes.observe(cost)
+            yield chunk
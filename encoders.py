@@ -0,0 +1,146 @@
+import logging
+import mimetypes
+import os
+
+import numpy as np
+import soundfile as sf
+
+from postprocessor import PolyphaseResampler
+from wav_stream import from_pcm16
+
+logger = logging.getLogger(__name__)
+
+BLOCK_FRAMES = 65536
+
+# output_format -> (libsndfile format, subtype, extension)
+FORMATS = {
+    "flac": ("FLAC", "PCM_16", ".flac"),
+    "ogg": ("OGG", "VORBIS", ".ogg"),
+    "vorbis": ("OGG", "VORBIS", ".ogg"),
+    "opus": ("OGG", "OPUS", ".opus"),
+}
+OPUS_RATE = 48000  # libsndfile's Ogg/Opus is only reliable at Opus' native rate
+
+# So /audio/play serves the encoded files with a playable content type
+mimetypes.add_type("audio/flac", ".flac")
+mimetypes.add_type("audio/ogg", ".ogg")
+mimetypes.add_type("audio/ogg", ".opus")
+
+
+def parse_flag(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def output_options(output_format=None, quality=None):
+    '''
+        Checks a task's output_format and quality and returns them normalized, so bad values
+        are refused when the task is submitted instead of after its render.
+    '''
+    output_format = str(output_format or "wav").strip().lower()
+    if output_format != "wav" and output_format not in FORMATS:
+        raise ValueError(f"Unsupported output_format '{output_format}', expected wav, {', '.join(FORMATS)}")
+    if quality in (None, ""):
+        return output_format, None
+    try:
+        quality = float(quality)
+    except (TypeError, ValueError):
+        raise ValueError(f"quality must be a number from 0 to 1, got '{quality}'") from None
+    if not 0 <= quality <= 1:
+        raise ValueError(f"quality must be between 0 and 1, got {quality}")
+    return output_format, quality
+
+
+def encode(wav_path, output_format, quality=None, keep_wav=False):
+    '''
+        Encodes a finished WAV to FLAC or Ogg (Vorbis/Opus) block by block and returns the new path.
+        quality is libsndfile's compression level from 0 (largest/best) to 1 (smallest).
+        The WAV is removed afterwards unless keep_wav is set.
+    '''
+    output_format, quality = output_options(output_format, quality)
+    if output_format == "wav":
+        return wav_path
+
+    container, subtype, extension = FORMATS[output_format]
+    output_path = os.path.splitext(wav_path)[0] + extension
+    tmp_path = output_path + ".part"
+
+    info = sf.info(wav_path)
+    out_rate = OPUS_RATE if subtype == "OPUS" else info.samplerate
+    resampler = PolyphaseResampler(info.samplerate, out_rate, info.channels) if out_rate != info.samplerate else None
+    options = {"compression_level": quality} if quality is not None else {}
+
+    logger.info(f"🗜️ Encoding {wav_path} to {container}/{subtype} at {out_rate} Hz")
+    with sf.SoundFile(tmp_path, 'w', out_rate, info.channels, format=container, subtype=subtype, **options) as out:
+        remaining = info.frames
+        # FLAC gets the PCM samples as they are, so it stays lossless. The lossy codecs are given
+        # floats converted like encode_stream's, libsndfile would scale their shorts by 1/32767
+        lossless = subtype.startswith("PCM") and resampler is None
+        for block in sf.blocks(wav_path, blocksize=BLOCK_FRAMES, dtype='int16', always_2d=True):
+            remaining -= len(block)
+            if not lossless:
+                block = from_pcm16(block, info.channels)
+            if resampler is not None:
+                block = resampler.process(block, final=remaining <= 0)
+            out.write(block)
+    os.replace(tmp_path, output_path)
+
+    saved = os.path.getsize(wav_path) / max(1, os.path.getsize(output_path))
+    logger.info(f"✅ Encoded {output_path} ({saved:.1f}x smaller than the WAV)")
+    if not keep_wav:
+        os.remove(wav_path)
+    return output_path
+
+
+class PageSink:
+    '''
+        Write-only file object for libsndfile that keeps the bytes written since they were last taken.
+    '''
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def write(self, data):
+        self.buffer += bytes(data)
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # Ogg is written front to back, libsndfile only asks for the position
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def encode_stream(pcm_blocks, sample_rate, output_format="ogg", quality=None):
+    '''
+        Encodes an iterable of 16-bit mono PCM blocks to Ogg Vorbis or Opus and yields the
+        pages as soon as the encoder produces them, for streaming responses.
+    '''
+    output_format, quality = output_options(output_format or "ogg", quality)
+    container, subtype, _ = FORMATS.get(output_format, (None, None, None))
+    if container != "OGG":
+        raise ValueError(f"Unsupported stream format '{output_format}', expected ogg, vorbis or opus")
+
+    out_rate = OPUS_RATE if subtype == "OPUS" else sample_rate
+    resampler = PolyphaseResampler(sample_rate, out_rate, 1) if out_rate != sample_rate else None
+    options = {"compression_level": quality} if quality is not None else {}
+
+    sink = PageSink()
+    with sf.SoundFile(sink, 'w', out_rate, 1, format=container, subtype=subtype, **options) as out:
+        for pcm in pcm_blocks:
+            block = from_pcm16(pcm)
+            if resampler is not None:
+                block = resampler.process(block)
+            out.write(block)
+            data = sink.take()
+            if data:
+                yield data
+        if resampler is not None:
+            out.write(resampler.process(np.zeros((0, 1), dtype=np.float32), final=True))
+    yield sink.take()
@@ -0,0 +1,66 @@
+import posixpath
+import zipfile
+from urllib.parse import unquote
+
+from ebooklib import epub
+from lxml import etree
+
+CONTAINER_PATH = "META-INF/container.xml"
+NAMESPACES = {
+    "container": "urn:oasis:names:tc:opendocument:xmlns:container",
+    "opf": "http://www.idpf.org/2007/opf",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+# The media type ebooklib reads as documents (EpubHtml and EpubNav)
+DOCUMENT_MEDIA_TYPE = "application/xhtml+xml"
+
+
+class SpineReader:
+    '''
+    The spine documents of an EPUB, read one at a time straight from the zip.
+    Only container.xml and the package document are parsed up front. Images, fonts
+    and documents outside the spine are never read. Each document comes out as
+    ebooklib's EpubHtml.get_content() would return it: that drops the original
+    <head> and text outside the body's elements, so it yields the same text as
+    epub.read_epub followed by get_items_of_type(ITEM_DOCUMENT).
+    '''
+    def __init__(self, path):
+        self.path = path
+        with zipfile.ZipFile(path) as archive:
+            container = etree.fromstring(archive.read(CONTAINER_PATH))
+            rootfile = container.find(".//container:rootfile", NAMESPACES)
+            if rootfile is None:
+                raise epub.EpubException(-1, "Can not find container file")
+            opf_path = rootfile.get("full-path")
+            package = etree.fromstring(archive.read(opf_path))
+            opf_dir = posixpath.dirname(opf_path)
+
+            language = package.findtext(".//dc:language", default="", namespaces=NAMESPACES).strip()
+            manifest = {}
+            for item in package.iterfind("opf:manifest/opf:item", NAMESPACES):
+                if item.get("media-type") == DOCUMENT_MEDIA_TYPE:
+                    manifest[item.get("id")] = unquote(item.get("href"))
+
+            self.documents = []
+            for itemref in package.iterfind("opf:spine/opf:itemref", NAMESPACES):
+                uid = itemref.get("idref")
+                if uid in manifest:
+                    member = posixpath.normpath(posixpath.join(opf_dir, manifest[uid]))
+                    self.documents.append((uid, manifest[uid], member))
+            self.size = sum(archive.getinfo(member).file_size for _, _, member in self.documents)
+
+        # Supplies the templates and language get_content builds documents from
+        self._book = epub.EpubBook()
+        if language:
+            self._book.set_language(language)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __iter__(self):
+        with zipfile.ZipFile(self.path) as archive:
+            for uid, file_name, member in self.documents:
+                item = epub.EpubHtml(uid=uid, file_name=file_name)
+                item.content = archive.read(member)
+                item.book = self._book
+                yield item.get_content()
@@ -0,0 +1,166 @@
+import html
+import logging
+import os
+import re
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# Strings whose immediate parent is one of these are not visible text
+BLACKLIST = {'[document]', 'noscript', 'header', 'html', 'meta', 'head', 'input', 'script', 'style'}
+# html.parser reads their content as one raw string, and BLACKLIST drops it
+RAW_TEXT = {'script', 'style'}
+DEFAULT_BACKEND = os.environ.get("TTS_HTML_BACKEND", "lxml")
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def bs4_strings(content, skiplinks):
+    '''
+        Reference backend: BeautifulSoup with html.parser, as chap2text always did.
+    '''
+    soup = BeautifulSoup(content, 'html.parser')
+
+    if skiplinks:
+        for a in soup.find_all('a', href=True):
+            a.extract()
+
+    # Remove footnote-style anchors (digits only)
+    for a in soup.find_all('a', href=True):
+        if a.text.strip().isdigit():
+            a.extract()
+
+    texts = []
+    for tag in soup.find_all(text=True):
+        if tag.parent.name in BLACKLIST:
+            continue
+        txt = tag.strip()
+        if txt:
+            texts.append(txt)
+    return texts
+
+
+def lxml_name(element):
+    '''
+        The tag name html.parser would report: lowercased, with the namespace prefix rather than the URI.
+    '''
+    if element is None:
+        return '[document]'
+    name = element.tag
+    if name[0] == '{':
+        name = name.split('}', 1)[1]
+        if element.prefix:
+            name = f"{element.prefix}:{name}"
+    return name.lower()
+
+
+def lxml_text(element):
+    '''
+        What bs4's Tag.text returns: text and entities of the subtree, without comments, scripts and styles.
+    '''
+    parts = []
+    stack = [(element, False)]
+    while stack:
+        node, tail = stack.pop()
+        if tail:
+            if node.tail:
+                parts.append(node.tail)
+            continue
+        if node is not element:
+            stack.append((node, True))
+        if node.tag is etree.Entity:
+            parts.append(html.unescape(node.text))
+        elif isinstance(node.tag, str) and lxml_name(node) not in RAW_TEXT:
+            if node.text:
+                parts.append(node.text)
+            stack.extend((child, False) for child in reversed(node))
+    return "".join(parts)
+
+
+def lxml_tree(content):
+    '''
+        EPUB chapters are XHTML, which the XML parser reads into the same tree html.parser builds.
+        Anything that is not well-formed goes through libxml2's HTML parser instead.
+    '''
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    try:
+        # Undeclared entities such as &nbsp; are kept as Entity nodes and unescaped like html.parser does
+        return etree.fromstring(content, etree.XMLParser(resolve_entities=False, load_dtd=False, no_network=True, huge_tree=True))
+    except etree.XMLSyntaxError as e:
+        logger.debug(f"Not well-formed XHTML ({e}), parsing as HTML")
+        return etree.fromstring(content, etree.HTMLParser(no_network=True, huge_tree=True))
+
+
+def lxml_strings(content, skiplinks):
+    '''
+        Same strings as bs4_strings in a single iterative pass over an lxml tree: text belongs
+        to its element, a tail to the element's parent, and removed anchors keep their tail.
+        html.parser makes one string of a run of text and entities, so runs are only cut
+        where a tag or comment starts or ends.
+    '''
+    root = lxml_tree(content)
+    if root is None:
+        return []
+
+    texts = []
+    run = []
+    run_parent = None
+
+    def flush():
+        if run:
+            text = "".join(run).strip()
+            if text and lxml_name(run_parent) not in BLACKLIST:
+                texts.append(text)
+            run.clear()
+
+    stack = [(root, False)]
+    while stack:
+        node, tail = stack.pop()
+        if tail:
+            if node.tag is not etree.Entity:
+                flush()
+            if node.tail:
+                run_parent = node.getparent()
+                run.append(node.tail)
+            continue
+        stack.append((node, True))
+
+        if node.tag is etree.Entity:
+            run_parent = node.getparent()
+            run.append(html.unescape(node.text))
+            continue
+        flush()
+        if node.tag is etree.Comment:
+            run_parent = node.getparent()
+            run.append(node.text or "")
+            flush()
+        elif isinstance(node.tag, str):
+            name = lxml_name(node)
+            if name in RAW_TEXT:
+                continue
+            if name == 'a' and node.get('href') is not None:
+                if skiplinks or lxml_text(node).strip().isdigit():
+                    continue
+            if node.text:
+                run_parent = node
+                run.append(node.text)
+            stack.extend((child, False) for child in reversed(node))
+    flush()
+    return texts
+
+
+BACKENDS = {"bs4": bs4_strings, "lxml": lxml_strings}
+
+
+def html_to_text(content, skiplinks, backend=None):
+    '''
+        Visible text of an HTML/XHTML document as one line with collapsed whitespace.
+    '''
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown HTML backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    output = ' '.join(BACKENDS[backend](content, skiplinks))
+    return WHITESPACE.sub(' ', output).strip()
@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+JOB_DB = os.environ.get("TTS_JOB_DB", "jobs.db")
+MAX_ATTEMPTS = int(os.environ.get("TTS_JOB_MAX_ATTEMPTS", 3))
+HEARTBEAT_INTERVAL = 30  # seconds between "still running" updates from a worker
+STALE_AFTER = HEARTBEAT_INTERVAL * 4
+PROGRESS_INTERVAL = 2  # minimum seconds between progress writes of a render
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    config TEXT NOT NULL,
+    chars INTEGER NOT NULL DEFAULT 0,
+    kind TEXT NOT NULL DEFAULT 'tts',
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    output_path TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+CREATE TABLE IF NOT EXISTS progress (
+    job_id INTEGER PRIMARY KEY,
+    stage TEXT NOT NULL,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    chunks_total INTEGER NOT NULL DEFAULT 0,
+    audio_seconds REAL NOT NULL DEFAULT 0,
+    elapsed REAL NOT NULL DEFAULT 0,
+    rtf REAL,
+    eta REAL,
+    retries INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+# Columns added after the first release, only added to databases created before them
+MIGRATIONS = {
+    "chars": "INTEGER NOT NULL DEFAULT 0",
+    "kind": "TEXT NOT NULL DEFAULT 'tts'",
+}
+# What a worker does with a job: render a clean_text file, or turn an uploaded EPUB into clean_text files
+JOB_KINDS = ("tts", "ingest")
+
+
+class JobStore:
+    '''
+    Durable job queue on a local SQLite database, for renders and EPUB ingestion alike.
+    Jobs move queued -> running -> done/failed. Workers claim them atomically,
+    so any number of processes can share the file, and jobs left running by a
+    worker that died are put back in the queue until MAX_ATTEMPTS is reached.
+    '''
+    def __init__(self, path=JOB_DB):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in MIGRATIONS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    def _connect(self):
+        # A connection per call, sqlite3 connections must not be shared between threads
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return closing(conn)
+
+    @staticmethod
+    def _as_dict(row):
+        job = dict(row)
+        job["config"] = json.loads(job["config"])
+        return job
+
+    def enqueue(self, config, chars=0, kind="tts"):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}', expected one of {', '.join(JOB_KINDS)}")
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (config, chars, kind, created_at) VALUES (?, ?, ?, ?)",
+                (json.dumps(config), chars, kind, time.time())
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker, choose=None, key=None):
+        '''
+            Marks a queued job as running for worker and returns it, or None if no queued job can start.
+            choose picks the job from the queued ones (oldest first), by default the oldest wins.
+            key maps a job to the resource it works in (None for none): queued jobs sharing it
+            with a running job wait until that job has finished.
+        '''
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock up front, so two workers never claim the same row
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = [self._as_dict(row) for row in conn.execute("SELECT * FROM jobs WHERE state = 'queued' ORDER BY id")]
+                if key is not None and queued:
+                    busy = {key(self._as_dict(row)) for row in conn.execute("SELECT * FROM jobs WHERE state = 'running'")}
+                    busy.discard(None)
+                    queued = [job for job in queued if key(job) not in busy]
+                if not queued:
+                    conn.execute("COMMIT")
+                    return None
+                job = choose(queued) if choose is not None else queued[0]
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET state = 'running', attempts = attempts + 1, worker = ?, "
+                    "started_at = ?, heartbeat_at = ?, error = NULL WHERE id = ?",
+                    (worker, now, now, job["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(job["id"])
+
+    def heartbeat(self, job_id):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND state = 'running'", (time.time(), job_id))
+
+    def complete(self, job_id, output_path):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'done', output_path = ?, finished_at = ? WHERE id = ?",
+                (output_path, time.time(), job_id)
+            )
+
+    def fail(self, job_id, error):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                (str(error), time.time(), job_id)
+            )
+
+    def recover(self, worker=None, stale_after=STALE_AFTER):
+        '''
+            Requeues jobs whose worker is gone: those of the given worker, or otherwise
+            every running job without a heartbeat for stale_after seconds.
+            Jobs that already used up their attempts are marked failed instead.
+        '''
+        if worker is not None:
+            condition, params = "worker = ?", (worker,)
+        else:
+            condition, params = "heartbeat_at < ?", (time.time() - stale_after,)
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            failed = conn.execute(
+                f"UPDATE jobs SET state = 'failed', error = 'Worker stopped while rendering', finished_at = ? "
+                f"WHERE state = 'running' AND attempts >= ? AND {condition}",
+                (time.time(), MAX_ATTEMPTS) + params
+            ).rowcount
+            requeued = conn.execute(
+                f"UPDATE jobs SET state = 'queued', worker = NULL WHERE state = 'running' AND {condition}",
+                params
+            ).rowcount
+            conn.execute("COMMIT")
+
+        if failed or requeued:
+            logger.warning(f"♻️ Recovered interrupted jobs: {requeued} requeued, {failed} failed after {MAX_ATTEMPTS} attempts")
+        return requeued
+
+    def publish_progress(self, job_id, **fields):
+        fields["job_id"] = job_id
+        fields["updated_at"] = time.time()
+        columns = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        with self._connect() as conn:
+            conn.execute(f"INSERT OR REPLACE INTO progress ({columns}) VALUES ({placeholders})", tuple(fields.values()))
+
+    def progress(self, job_ids):
+        '''
+            Latest progress of the given jobs as a dict of job id -> progress row.
+        '''
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in job_ids)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT * FROM progress WHERE job_id IN ({placeholders})", job_ids).fetchall()
+        return {row["job_id"]: dict(row) for row in rows}
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._as_dict(row) if row is not None else None
+
+    def counts(self):
+        with self._connect() as conn:
+            return {row["state"]: row["n"] for row in conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state")}
+
+    def by_state(self, state, limit=-1, newest_first=False):
+        order = "DESC" if newest_first else "ASC"
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE state = ? ORDER BY id {order} LIMIT ?", (state, limit)
+            ).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+class ProgressReporter:
+    '''
+    Publishes how far a render got to the job store: chunks done out of total,
+    seconds of audio assembled, retries, and the real-time factor (render seconds
+    per second of audio) of the chunks rendered in this attempt, from which the
+    remaining time is estimated. Writes are throttled to one per PROGRESS_INTERVAL.
+    '''
+    def __init__(self, store, job_id, chunks_total, chunks_done=0, audio_seconds=0.0, interval=PROGRESS_INTERVAL):
+        self.store = store
+        self.job_id = job_id
+        self.chunks_total = chunks_total
+        self.interval = interval
+        # Chunks resumed from an earlier attempt cost nothing now, keep them out of the speed
+        self._start_chunks = chunks_done
+        self._start_audio = audio_seconds
+        self._started = time.monotonic()
+        self._last_publish = 0.0
+
+    def update(self, chunks_done, audio_seconds, retries=0, stage="rendering", force=False):
+        now = time.monotonic()
+        if not force and now - self._last_publish < self.interval:
+            return
+        self._last_publish = now
+        if self.job_id is None:
+            return
+
+        elapsed = now - self._started
+        rendered_audio = audio_seconds - self._start_audio
+        rendered_chunks = chunks_done - self._start_chunks
+        rtf = elapsed / rendered_audio if rendered_audio > 0 else None
+        eta = elapsed / rendered_chunks * (self.chunks_total - chunks_done) if rendered_chunks > 0 else None
+        try:
+            self.store.publish_progress(
+                self.job_id, stage=stage, chunks_done=chunks_done, chunks_total=self.chunks_total,
+                audio_seconds=audio_seconds, elapsed=elapsed, rtf=rtf, eta=eta, retries=retries
+            )
+        except sqlite3.Error as e:
+            # Progress is informational, a busy database must not fail the render
+            logger.warning(f"⚠️ Could not publish progress of job {self.job_id}: {e}")
+
+
+# Shared by the web app and every worker process
+jobs = JobStore()
@@ -0,0 +1,167 @@
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Loaded in this order, a key in a later file overrides the earlier one
+LEXICON_FILES = ("custom_words.txt", "custom_phonemes.txt")
+
+WORD_CHAR = re.compile(r"\w")
+WHITESPACE = r"\s+"
+
+
+def normalize_key(key):
+    '''
+        Lowercase with single spaces, the form keys are stored and looked up in.
+    '''
+    return " ".join(key.lower().split())
+
+
+class PronunciationLexicon:
+    '''
+    Replaces every dictionary key found in a text with its pronunciation in one regex pass.
+    The keys are compiled into a trie-shaped regex, so a position is only tried against the
+    keys sharing its prefix, and the cost follows the text length rather than the number
+    of entries. Keys may span several words (matched across any whitespace) and contain
+    punctuation ("Mr.", "A.I."). A key never ends inside a word, so "Mr." leaves
+    "Mr.Smith" alone, and a key starting with a word character also needs a word boundary
+    before it. Matching is case-insensitive.
+    The files are reloaded when their mtime changes.
+    '''
+    def __init__(self, paths=LEXICON_FILES):
+        self.paths = tuple(paths)
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._entries = {}
+        self._pattern = None
+        self._folded_pattern = None
+
+    def stamp(self):
+        stamp = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                stamp.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append((path, None, None))
+        return tuple(stamp)
+
+    def refresh(self):
+        stamp = self.stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            entries = self.load()
+            source = self.build_pattern(entries)
+            self._entries = entries
+            self._pattern = re.compile(source) if source else None
+            self._folded_pattern = re.compile(source, re.IGNORECASE) if source else None
+            if self._stamp is not None:
+                logger.info(f"Reloaded pronunciation lexicon: {len(entries)} entries")
+            self._stamp = stamp
+
+    def load(self):
+        entries = {}
+        for path in self.paths:
+            if not os.path.exists(path):
+                logger.warning(f"Pronunciation file {path} not found, skipping it")
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    if "|" not in line:
+                        logger.warning(f"{path}:{line_number}: expected 'word|pronunciation', skipping")
+                        continue
+                    word, pronunciation = line.split("|", maxsplit=1)
+                    key = normalize_key(word)
+                    if key:
+                        entries[key] = pronunciation
+        return entries
+
+    @staticmethod
+    def build_pattern(entries):
+        '''
+            One alternation over two tries: keys starting with a word character sit behind
+            a single (?<!\\w), so positions inside a word are rejected before any key is tried.
+        '''
+        word_start, other_start = {}, {}
+        for key in entries:
+            node = word_start if WORD_CHAR.match(key[0]) else other_start
+            for char in key:
+                node = node.setdefault(char, {})
+            # Every key ends where a word does, also after punctuation ("Mr." in "Mr.Smith")
+            node[""] = r"(?!\w)"
+
+        branches = []
+        if word_start:
+            branches.append(r"(?<!\w)" + PronunciationLexicon._trie_pattern(word_start))
+        if other_start:
+            branches.append(PronunciationLexicon._trie_pattern(other_start))
+        return "|".join(branches)
+
+    @staticmethod
+    def _trie_pattern(node):
+        # Longer keys first: the end of a key is only taken when no longer key continues there
+        alternatives = [
+            (WHITESPACE if char == " " else re.escape(char)) + PronunciationLexicon._trie_pattern(child)
+            for char, child in sorted(item for item in node.items() if item[0])
+        ]
+        if "" in node:
+            alternatives.append(node[""])
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    def __len__(self):
+        self.refresh()
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        self.refresh()
+        return self._entries.get(normalize_key(key), default)
+
+    def apply(self, text):
+        self.refresh()
+        entries, pattern = self._entries, self._pattern
+        if pattern is None:
+            return text
+
+        folded = text.lower()
+        if len(folded) != len(text):
+            # Some characters change length when lowercased, offsets would not line up
+            return self._folded_pattern.sub(lambda match: entries.get(normalize_key(match.group(0)), match.group(0)), text)
+
+        pieces = []
+        position = 0
+        for match in pattern.finditer(folded):
+            start, end = match.span()
+            pieces.append(text[position:start])
+            pieces.append(entries.get(normalize_key(match.group(0)), text[start:end]))
+            position = end
+        pieces.append(text[position:])
+        return "".join(pieces)
+
+
+class LexiconRegistry:
+    '''
+        One lexicon per set of files, shared by every TextIn in the process.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lexicons = {}
+
+    def get(self, *paths):
+        paths = tuple(os.path.abspath(path) for path in (paths or LEXICON_FILES))
+        with self._lock:
+            if paths not in self._lexicons:
+                self._lexicons[paths] = PronunciationLexicon(paths)
+            return self._lexicons[paths]
+
+
+lexicons = LexiconRegistry()
@@ -0,0 +1,254 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from threading import Lock
+
+import soundfile as sf
+
+from wav_stream import HEADER_SIZE
+
+logger = logging.getLogger(__name__)
+
+SCRATCH_FOLDER = "scratch"
+RENDER_FOLDER = os.environ.get("TTS_RENDER_DIR", "renders")
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# Length of the hash that tells the tasks of one file apart in a task_key
+TASK_HASH_LENGTH = 12
+
+
+def task_key(file_path, voice):
+    base_filename = os.path.splitext(os.path.basename(file_path))[0]
+    return f"{base_filename}-{text_hash(f'{os.path.abspath(file_path)}|{voice}')[:TASK_HASH_LENGTH]}"
+
+
+class TaskScratch:
+    '''
+    Private working directory of a single TTS task.
+    Holds the partially assembled output plus manifest.json, which records
+    every chunk's text hash, voice, status and frame count so an interrupted
+    render resumes exactly where it stopped and never reuses audio rendered
+    for other text.
+    '''
+    MANIFEST = "manifest.json"
+
+    def __init__(self, file_path, voice, root=SCRATCH_FOLDER):
+        self.path = os.path.join(root, task_key(file_path, voice))
+        self.file_path = file_path
+        self.voice = voice
+        self.chunks = []
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.path, self.MANIFEST)
+
+    @property
+    def output_path(self):
+        return os.path.join(self.path, "output.wav")
+
+    def load(self):
+        if not os.path.exists(self.manifest_path):
+            return []
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("chunks", [])
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable manifest {self.manifest_path}: {e}")
+            return []
+
+    def save(self):
+        manifest = {"file": self.file_path, "voice": self.voice, "chunks": self.chunks}
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        # Atomic swap so a crash never leaves a half-written manifest behind
+        os.replace(tmp_path, self.manifest_path)
+
+    def open(self, chunks):
+        '''
+            Prepares the directory for the given chunk texts. The leading run of chunks
+            already assembled from the same text and voice is kept, everything after
+            the first mismatch is reset to pending.
+        '''
+        os.makedirs(self.path, exist_ok=True)
+        previous = {entry["index"]: entry for entry in self.load()}
+        assembled = sum(entry.get("frames", 0) for entry in previous.values() if entry.get("status") == "done")
+        if not os.path.exists(self.output_path) or os.path.getsize(self.output_path) < HEADER_SIZE + assembled * 2:
+            previous = {}
+
+        self.chunks = []
+        resuming = True
+        for idx, text in enumerate(chunks):
+            entry = {"index": idx, "hash": text_hash(text), "voice": self.voice, "status": "pending", "frames": 0}
+            old = previous.get(idx)
+            resuming = resuming and (
+                old is not None and old.get("status") == "done" and
+                old.get("hash") == entry["hash"] and old.get("voice") == self.voice
+            )
+            if resuming:
+                entry["status"] = "done"
+                entry["frames"] = old.get("frames", 0)
+            self.chunks.append(entry)
+
+        self.save()
+        done = sum(1 for entry in self.chunks if entry["status"] == "done")
+        if done:
+            logger.info(f"⏩ Resuming {self.path}: {done}/{len(self.chunks)} chunks already rendered.")
+
+    def is_done(self, idx):
+        return self.chunks[idx]["status"] == "done"
+
+    def resume_frames(self):
+        '''
+            Frames of the output that belong to already assembled chunks.
+        '''
+        return sum(entry["frames"] for entry in self.chunks if entry["status"] == "done")
+
+    def mark_done(self, idx, frames, save=True):
+        self.chunks[idx]["status"] = "done"
+        self.chunks[idx]["frames"] = frames
+        if save:
+            self.save()
+
+    def missing(self):
+        return [entry["index"] for entry in self.chunks if entry["status"] != "done"]
+
+    @staticmethod
+    def find_output(file_path, root=SCRATCH_FOLDER):
+        '''
+            Returns the partial output of the most recently active render of file_path, or None.
+        '''
+        base_filename = os.path.splitext(os.path.basename(file_path))[0]
+        # Only task_key directories of this file, "book" must not pick up "book-part_1-<hash>"
+        key = re.compile(re.escape(base_filename) + f"-[0-9a-f]{{{TASK_HASH_LENGTH}}}")
+        candidates = [
+            path for path in glob.glob(os.path.join(glob.escape(root), f"{glob.escape(base_filename)}-*", "output.wav"))
+            if key.fullmatch(os.path.basename(os.path.dirname(path)))
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=os.path.getmtime)
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class RenderRecord:
+    '''
+    What the last finished render of a file with a voice was made of: the unit
+    hashes (sentences) every chunk was packed from, each chunk's text hash and
+    frames, the settings that shape the audio, and the output the chunks can be
+    read back from. Re-rendering after an edit packs the unchanged sentences
+    into the same chunks again and takes their audio from that output, so only
+    the chunks around the edit are synthesized.
+    '''
+    def __init__(self, file_path, voice, root=RENDER_FOLDER):
+        self.path = os.path.join(root, f"{task_key(file_path, voice)}.json")
+        self.file_path = file_path
+        self.voice = voice
+        self.data = self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable render record {self.path}: {e}")
+            return {}
+
+    def layout(self):
+        return [tuple(chunk["units"]) for chunk in self.data.get("chunks", [])]
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+        return {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def reader(self, settings):
+        '''
+            A PreviousRender over the recorded output, or None when there is none, it was
+            rendered with other settings or the file changed since.
+        '''
+        source = self.data.get("source")
+        if not source or self.data.get("settings") != settings:
+            return None
+        try:
+            if self._stamp(source["path"]) != source:
+                logger.info(f"♻️ {source['path']} changed since it was rendered, not reusing its audio")
+                return None
+            return PreviousRender(source["path"], self.data["chunks"])
+        except (OSError, RuntimeError, KeyError) as e:
+            logger.warning(f"⚠️ Previous render of {self.file_path} is unusable: {e}")
+            return None
+
+    def save(self, layout, frames, settings, outputs):
+        '''
+            Records a finished render. layout holds (chunk, unit hashes) pairs and frames the
+            frames of each chunk. The first of outputs holding exactly the narration as 16-bit
+            PCM at the rendered rate becomes the source. A FLAC deliverable qualifies because
+            encode hands it the WAV's samples unchanged, so reused chunks match cached ones.
+        '''
+        chunks = []
+        offset = 0
+        for (chunk, units), count in zip(layout, frames):
+            chunks.append({"hash": text_hash(chunk), "units": list(units), "offset": offset, "frames": count})
+            offset += count
+
+        source = None
+        for path in outputs:
+            try:
+                info = sf.info(path)
+            except (OSError, RuntimeError):
+                continue
+            if (info.samplerate, info.channels, info.subtype, info.frames) == (settings["sample_rate"], 1, "PCM_16", offset):
+                source = self._stamp(path)
+                break
+
+        record = {"file": self.file_path, "voice": self.voice, "settings": settings, "source": source, "chunks": chunks}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self.path)
+        self.data = record
+
+
+class PreviousRender:
+    '''
+        Reads the audio of single chunks back out of a finished output by text hash.
+    '''
+    def __init__(self, path, chunks):
+        self.path = path
+        self.spans = {}
+        for chunk in chunks:
+            self.spans.setdefault(chunk["hash"], (chunk["offset"], chunk["frames"]))
+        self._file = sf.SoundFile(path)
+        self._lock = Lock()
+
+    def read(self, text):
+        '''
+            The chunk's 16-bit PCM frames, or None when the previous render had no such chunk.
+        '''
+        span = self.spans.get(text_hash(text))
+        if span is None:
+            return None
+        offset, frames = span
+        with self._lock:
+            self._file.seek(offset)
+            audio = self._file.read(frames, dtype="int16")
+        if len(audio) != frames:
+            return None
+        return audio.astype("<i2").tobytes()
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,341 @@
+import atexit
+import copy
+import glob
+import json
+import logging
+import os
+import time
+from functools import wraps
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.environ.get("TTS_METRICS_DIR", "metrics")
+FLUSH_INTERVAL = 5  # seconds between snapshot writes of a process
+# Sum of the snapshots of exited processes, and the snapshot files already added to it
+TOTALS_FILE = "totals.json"
+FOLDED_KEY = "_folded"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+AUDIO_BUCKETS = (1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5)
+WAIT_BUCKETS = (1, 10, 30, 60, 300, 600, 1800, 3600, 7200, 14400, 43200, 86400)
+PHONEME_BUCKETS = (50, 100, 200, 300, 350, 400, 450, 480, 510)
+
+
+def _label_key(labels):
+    return json.dumps(sorted(labels.items()))
+
+
+def _format_labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+def _process_alive(pid):
+    if os.name != "posix":
+        return True  # os.kill would terminate the process, snapshots are kept instead
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists but belongs to someone else
+    return True
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _load_snapshot(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # being replaced right now, picked up on the next scrape
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        self._registry = registry
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self._registry.changed()
+
+    def snapshot(self):
+        return dict(self.values)
+
+    @staticmethod
+    def merge(total, values):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def render(self, values):
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(json.loads(key))} {_format_value(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.values = {}  # label key -> [per-bucket counts (last is +Inf), sum]
+        self._registry = registry
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._registry.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+        self._registry.changed()
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        '''
+            Decorator observing the duration of every call.
+        '''
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        return {key: [list(counts), total] for key, (counts, total) in self.values.items()}
+
+    @staticmethod
+    def merge(total, values):
+        for key, (counts, value_sum) in values.items():
+            entry = total.setdefault(key, [[0] * len(counts), 0.0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += value_sum
+
+    def render(self, values):
+        for key, (counts, value_sum) in sorted(values.items()):
+            labels = json.loads(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(value_sum)}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+class Gauge:
+    '''
+    Point-in-time value, set by the process that serves /metrics right before rendering.
+    '''
+    kind = "gauge"
+
+    def __init__(self, registry, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        registry.register(self)
+
+    def set(self, value, **labels):
+        self.values[_label_key(labels)] = value
+
+    def snapshot(self):
+        return {}  # not shared between processes
+
+    @staticmethod
+    def merge(total, values):
+        pass
+
+    def render(self, values):
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{_format_labels(json.loads(key))} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    '''
+    Metrics of every process of the app in the Prometheus text format.
+    Each process records into memory and a background thread writes a snapshot
+    to METRICS_DIR at most every FLUSH_INTERVAL seconds. The process serving
+    /metrics adds up the snapshots of all processes, so counts of workers that
+    died or were replaced are kept until the app restarts. Snapshots of exited
+    processes are folded into TOTALS_FILE, so the directory holds one file per
+    live process no matter how many workers and inference processes came and went.
+    '''
+    def __init__(self, directory=METRICS_DIR):
+        self.directory = directory
+        self.metrics = []
+        self.lock = Lock()
+        self._dirty = False
+        self._flusher = None
+        self._file = None
+        self._flush_lock = Lock()
+        self._fold_lock = Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def changed(self):
+        self._dirty = True
+        if self._flusher is None:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self.lock:
+            if self._flusher is not None:
+                return
+            self._file = os.path.join(self.directory, f"{os.getpid()}-{int(time.time() * 1000)}.json")
+            self._flusher = Thread(target=self._flush_periodically, name="metrics-flush", daemon=True)
+            self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        if not self._dirty or self._file is None:
+            return
+        with self._flush_lock:
+            with self.lock:
+                self._dirty = False
+                snapshot = {metric.name: metric.snapshot() for metric in self.metrics}
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = self._file + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, self._file)
+            except OSError as e:
+                logger.warning(f"⚠️ Could not write metrics snapshot {self._file}: {e}")
+
+    def reset(self):
+        '''
+            Removes the snapshots of a previous run, called once when the app starts.
+        '''
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            _remove_quietly(path)
+
+    def fold(self):
+        '''
+            Adds the snapshots of exited processes to TOTALS_FILE and removes them.
+            The totals list the files they include, so a file whose removal failed
+            is neither added twice nor counted next to the totals.
+            Returns the totals and the snapshot files of live processes.
+        '''
+        totals_path = os.path.join(self.directory, TOTALS_FILE)
+        with self._fold_lock:
+            previous = _load_snapshot(totals_path) or {}
+            folded = set(previous.get(FOLDED_KEY, ()))
+            live, exited = [], []
+            for path in glob.glob(os.path.join(self.directory, "*-*.json")):
+                name = os.path.basename(path)
+                pid = name.split("-", 1)[0]
+                if not pid.isdigit() or _process_alive(int(pid)):
+                    live.append(path)
+                elif name not in folded:
+                    exited.append(path)
+                else:
+                    _remove_quietly(path)  # already in the totals, an earlier removal failed
+            if not exited:
+                return previous, live
+
+            totals = copy.deepcopy(previous)
+            for path in exited:
+                snapshot = _load_snapshot(path)
+                if snapshot is None:
+                    continue  # unreadable, its process can no longer rewrite it
+                for metric in self.metrics:
+                    metric.merge(totals.setdefault(metric.name, {}), snapshot.get(metric.name, {}))
+            names = folded | {os.path.basename(path) for path in exited}
+            # Files removed by an earlier fold no longer need to be remembered
+            totals[FOLDED_KEY] = sorted(name for name in names if os.path.exists(os.path.join(self.directory, name)))
+            try:
+                tmp_path = totals_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(totals, f)
+                os.replace(tmp_path, totals_path)
+            except OSError as e:
+                logger.warning(f"⚠️ Could not write metrics totals {totals_path}: {e}")
+                return previous, live + exited
+            for path in exited:
+                _remove_quietly(path)
+            return totals, live
+
+    def render(self):
+        self.flush()
+        folded, live = self.fold()
+        totals = {metric.name: {} for metric in self.metrics}
+        for snapshot in [folded] + [_load_snapshot(path) for path in live]:
+            if snapshot is None:
+                continue
+            for metric in self.metrics:
+                metric.merge(totals[metric.name], snapshot.get(metric.name, {}))
+
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(totals[metric.name]))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Text preparation
+text_stage_seconds = Histogram(registry, "tts_text_stage_seconds", "Time spent in TextIn stages.")
+tokenize_seconds = Histogram(registry, "tts_tokenize_seconds", "Time to split a file into chunks.")
+chunk_phonemes = Histogram(registry, "tts_chunk_phonemes", "Estimated phoneme tokens of a chunk.", PHONEME_BUCKETS)
+
+# Synthesis
+chunk_synthesis_seconds = Histogram(registry, "tts_chunk_synthesis_seconds", "Synthesis latency of a chunk.")
+chunk_audio_seconds = Histogram(registry, "tts_chunk_audio_seconds", "Audio length of a synthesized chunk.", AUDIO_BUCKETS)
+chunk_retries = Counter(registry, "tts_chunk_retries_total", "Failed synthesis attempts that were retried.")
+chunk_cache_lookups = Counter(registry, "tts_chunk_cache_lookups_total", "Chunk cache lookups by result.")
+chunks_reused = Counter(registry, "tts_chunks_reused_total", "Chunks copied from the previous render of their file.")
+stream_first_audio_seconds = Histogram(registry, "tts_stream_first_audio_seconds", "Time from a streaming request to its first audio.")
+job_rtf = Histogram(registry, "tts_job_rtf", "Real-time factor of a render (render seconds per audio second).", RTF_BUCKETS)
+finalize_seconds = Histogram(registry, "tts_finalize_seconds", "Time spent finishing a render by step.")
+
+# Queue and workers
+queue_wait_seconds = Histogram(registry, "tts_queue_wait_seconds", "Time from submission to the start of a job, by kind.", WAIT_BUCKETS)
+jobs_finished = Counter(registry, "tts_jobs_finished_total", "Finished jobs by kind and result.")
+worker_busy_seconds = Counter(registry, "tts_worker_busy_seconds_total", "Seconds workers spent rendering jobs.")
+queue_depth = Gauge(registry, "tts_queue_depth", "Jobs waiting for a worker.")
+workers = Gauge(registry, "tts_workers", "Worker processes in the pool.")
+workers_busy = Gauge(registry, "tts_workers_busy", "Workers rendering a job right now.")
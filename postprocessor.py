@@ -1,8 +1,15 @@
 import logging
+import math
 import os
-from pydub import AudioSegment
 import wave
 
+import numpy as np
+import soundfile as sf
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import firwin
+
+from wav_stream import WavStreamWriter, from_pcm16, to_pcm16
+
 # Configure logging for the module
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -13,42 +20,177 @@ formatter = logging.Formatter('[%(levelname)s] %(message)s')
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+BLOCK_FRAMES = 65536  # narration frames read per block
+
+
+class LinearResampler:
+    '''
+    Streaming linear-interpolation resampler, the method pydub's set_frame_rate uses.
+    Feed consecutive blocks of shape (frames, channels) to process(); positions are
+    computed from the absolute sample index, so block boundaries leave no seams.
+    '''
+    def __init__(self, in_rate, out_rate, channels):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self._tail = np.zeros((0, channels), dtype=np.float32)
+        self._base = 0      # absolute input index of _tail[0]
+        self._received = 0  # input frames seen so far
+        self._emitted = 0   # output frames produced so far
+
+    def output_length(self, input_frames):
+        return math.ceil(input_frames * self.out_rate / self.in_rate)
+
+    def process(self, block, final=False):
+        self._received += len(block)
+        x = np.concatenate([self._tail, block])
+        if final:
+            # One frame of silence past the end to interpolate against
+            x = np.concatenate([x, np.zeros((1, x.shape[1]), dtype=x.dtype)])
+            end = self.output_length(self._received)
+        else:
+            # Output k needs input frames floor(k * in / out) and the one after it
+            end = ((self._received - 1) * self.out_rate - 1) // self.in_rate + 1
+
+        k = np.arange(self._emitted, max(end, self._emitted), dtype=np.int64)
+        num = k * self.in_rate
+        i0 = num // self.out_rate - self._base
+        frac = ((num % self.out_rate) / self.out_rate).astype(np.float32)[:, None]
+        out = x[i0] * (1 - frac) + x[i0 + 1] * frac
+
+        self._emitted += len(k)
+        next_i0 = (self._emitted * self.in_rate) // self.out_rate
+        self._tail = x[next_i0 - self._base:]
+        self._base = next_i0
+        return out
+
+    def resample(self, audio):
+        return self.process(audio, final=True)
+
+
+class PolyphaseResampler:
+    '''
+    Streaming polyphase FIR resampler with the same filter as scipy's resample_poly
+    (Kaiser-windowed low-pass, beta 5, 10 zero crossings per side). Each output frame
+    is one dot product with the filter phase it needs; all outputs of a block that
+    share a phase are computed as a single matrix-vector product over a strided view
+    of the input. The history carried between blocks keeps the output seamless.
+    '''
+
+    def __init__(self, in_rate, out_rate, channels):
+        g = math.gcd(in_rate, out_rate)
+        self.up = out_rate // g
+        self.down = in_rate // g
+        max_rate = max(self.up, self.down)
+        self.half_len = 10 * max_rate
+        h = firwin(2 * self.half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * self.up
+
+        # phases[p, q] = h[p + q * up]: the taps applied to x[i - q] for output phase p
+        self.taps = -(-len(h) // self.up)
+        h = np.concatenate([h, np.zeros(self.taps * self.up - len(h))])
+        phases = h.reshape(self.taps, self.up).T.astype(np.float32)
+        # Reversed so a phase lines up with an ascending window of input frames
+        self.reversed_phases = np.ascontiguousarray(phases[:, ::-1])
+
+        # Leading zeros stand in for the signal before the first frame
+        self._buffer = np.zeros((self.taps - 1, channels), dtype=np.float32)
+        self._base = -(self.taps - 1)  # absolute input index of _buffer[0]
+        self._received = 0
+        self._emitted = 0
+
+    def output_length(self, input_frames):
+        return -(-input_frames * self.up // self.down)
+
+    def process(self, block, final=False):
+        self._received += len(block)
+        x = np.concatenate([self._buffer, block.astype(np.float32)])
+        if final:
+            end = self.output_length(self._received)
+            # Zeros past the end, enough for the last output's newest tap
+            last = ((end - 1) * self.down + self.half_len) // self.up if end else 0
+            pad = max(0, last - (self._base + len(x)) + 1)
+            x = np.concatenate([x, np.zeros((pad, x.shape[1]), dtype=np.float32)])
+        else:
+            # Output n reads x up to (n * down + half_len) // up, which must already be here
+            end = max((self._received * self.up - self.half_len - 1) // self.down + 1, self._emitted)
+
+        out = np.zeros((max(0, end - self._emitted), x.shape[1]), dtype=np.float32)
+        if len(out):
+            # windows[w] = x[w .. w + taps - 1]; a strided view, nothing is copied
+            windows = sliding_window_view(x, self.taps, axis=0)
+            # Outputs `up` apart share a filter phase and step `down` frames through the input
+            for r in range(min(self.up, len(out))):
+                n = self._emitted + r
+                m = n * self.down + self.half_len
+                first = m // self.up - self._base - (self.taps - 1)
+                count = len(range(r, len(out), self.up))
+                rows = windows[first:first + (count - 1) * self.down + 1:self.down]
+                out[r::self.up] = rows @ self.reversed_phases[m % self.up]
+
+        self._emitted = max(end, self._emitted)
+        # Keep the history the next output still needs
+        oldest = (self._emitted * self.down + self.half_len) // self.up - (self.taps - 1)
+        self._buffer = x[oldest - self._base:]
+        self._base = oldest
+        return out
+
+    def resample(self, audio):
+        return self.process(audio, final=True)
+
+
+RESAMPLERS = {
+    "polyphase": PolyphaseResampler,
+    "linear": LinearResampler,
+}
+
 
 class ProductionWav:
+    '''
+    Mixes the intro/outro overlays into a narration WAV and exports <name>_final.wav.
+    The narration is streamed in fixed-size blocks; only the pre-decoded overlays and
+    one block of narration are ever held in memory.
+
+    Timing: with an intro the voice starts 12 s in, 5 s of silence follow the
+    voice (or the intro, if that is longer), and the outro fades in over up to
+    2 s and ends 500 ms before the end of the file.
+
+    Task config:
+        output_profile: "cd" (16-bit stereo 44.1kHz, default) or "native" (keep the narration's rate and channels)
+        resampler: "polyphase" (default) or "linear"
+    '''
+    INTRO_LEAD = 12.0
+    TAIL_SILENCE = 5.0
+    OUTRO_END_GAP = 0.5
+    OUTRO_FADE = 2.0
+
     def __init__(self, wav_path, config):
         self.wav_path = wav_path
+        self.output_path = self._get_output_path()
         self.intro_path = config.get("intro")
         self.outro_path = config.get("outro")
         self.volume_db = self._parse_volume(config.get("overlay_volume", -5))
 
-        self.base = AudioSegment.from_wav(self.wav_path)
-        logger.debug(f"Loaded base audio length: {len(self.base) / 1000:.2f} seconds")
-        self.apply_intro()
-        logger.debug(f"After apply_intro, length: {len(self.base) / 1000:.2f} seconds")
-        self.append_silence()
-        logger.debug(f"After append_silence, length: {len(self.base) / 1000:.2f} seconds")
-        self.apply_outro()
-        logger.debug(f"After apply_outro, length: {len(self.base) / 1000:.2f} seconds")
-
-        self.export_final()
-
-    def apply_intro(self):
-        if self.intro_path and os.path.exists(self.intro_path):
-            intro = AudioSegment.from_file(self.intro_path).apply_gain(self.volume_db)
-            delayed_voice = AudioSegment.silent(duration=12000) + self.base
-            logger.info(f"Intro length: {len(intro) / 1000:.2f} seconds")
-            logger.info(f"Delayed voice length: {len(delayed_voice) / 1000:.2f} seconds")
-
-            max_len = max(len(intro), len(delayed_voice))
-            output = AudioSegment.silent(duration=max_len)
+        self.resampler = RESAMPLERS.get(config.get("resampler", "polyphase"))
+        if self.resampler is None:
+            logger.warning(f"⚠️ Unknown resampler '{config.get('resampler')}', falling back to polyphase")
+            self.resampler = PolyphaseResampler
 
-            output = output.overlay(delayed_voice, position=0)
-            output = output.overlay(intro, position=0)
+        with wave.open(self.wav_path, 'rb') as wf:
+            self.in_rate = wf.getframerate()
+            self.in_channels = wf.getnchannels()
+            self.in_frames = wf.getnframes()
+        logger.debug(f"Loaded base audio length: {self.in_frames / self.in_rate:.2f} seconds")
 
-            self.base = output
-            logger.info(f"After intro overlay, length: {len(self.base) / 1000:.2f} seconds")
+        if config.get("output_profile", "cd") == "native":
+            self.out_rate = self.in_rate
+            self.out_channels = self.in_channels
         else:
-            logger.info("Skipping intro")
+            # Standard uncompressed 16-bit stereo at 44.1kHz
+            self.out_rate = 44100
+            self.out_channels = 2
+
+        self.intro = self.apply_intro()
+        self.outro = self.apply_outro()
+        self.export_final()
 
     def _parse_volume(self, vol):
         try:
@@ -57,57 +199,122 @@ class ProductionWav:
             logger.warning(f"⚠️ Invalid overlay_volume '{vol}', falling back to -5 dB")
             return -5.0
 
+    def _to_output_channels(self, audio):
+        if audio.shape[1] == self.out_channels:
+            return audio
+        if audio.shape[1] > 1:
+            audio = audio.mean(axis=1, keepdims=True)
+        return np.repeat(audio, self.out_channels, axis=1)
 
+    def _load_overlay(self, path):
+        '''
+            Decodes an overlay once, converted to the output format with the overlay gain applied.
+        '''
+        audio, rate = sf.read(path, dtype='float32', always_2d=True)
+        audio = self._to_output_channels(audio)
+        if rate != self.out_rate:
+            audio = self.resampler(rate, self.out_rate, audio.shape[1]).resample(audio)
+        return audio * np.float32(10 ** (self.volume_db / 20))
 
-
-    def append_silence(self):
-        self.base += AudioSegment.silent(duration=5000)
-        logger.info("✅ Appended 5 seconds of silence.")
+    def apply_intro(self):
+        if self.intro_path and os.path.exists(self.intro_path):
+            intro = self._load_overlay(self.intro_path)
+            logger.info(f"Intro length: {len(intro) / self.out_rate:.2f} seconds")
+            return intro
+        logger.info("Skipping intro")
+        return None
 
     def apply_outro(self):
         if self.outro_path and os.path.exists(self.outro_path):
             try:
-                outro = AudioSegment.from_file(self.outro_path).apply_gain(self.volume_db)
-                fade_duration = min(2000, len(outro))
-                outro = outro.fade_in(fade_duration)
-
-                # Ensure base is long enough (assumes silence already added)
-                required_length = len(outro) + 500
-                if len(self.base) < required_length:
-                    self.base += AudioSegment.silent(duration=required_length - len(self.base))
-
-                insert_point = len(self.base) - len(outro) - 500
-                output = AudioSegment.silent(duration=len(self.base))
-                output = output.overlay(self.base, position=0)
-                output = output.overlay(outro, position=insert_point)
-
-                self.base = output
-                logger.info(f"🎧 Outro overlay with fade-in applied. Starts at {insert_point} ms, ends at {insert_point + len(outro)} ms.")
+                outro = self._load_overlay(self.outro_path)
+                fade = min(int(self.OUTRO_FADE * self.out_rate), len(outro))
+                outro[:fade] *= np.linspace(0, 1, fade, endpoint=False, dtype=np.float32)[:, None]
+                return outro
             except Exception as e:
                 logger.error(f"❌ Error applying outro from '{self.outro_path}': {e}")
         else:
             logger.info("ℹ️ Skipping outro: Not provided or file not found.")
+        return None
 
+    def layout(self, voice_frames):
+        '''
+            Returns (voice_start, total_frames, outro_start) in output frames.
+        '''
+        voice_start = int(self.INTRO_LEAD * self.out_rate) if self.intro is not None else 0
+        total = voice_start + voice_frames
+        if self.intro is not None:
+            total = max(total, len(self.intro))
+        total += int(self.TAIL_SILENCE * self.out_rate)
+        logger.info("✅ Appended 5 seconds of silence.")
 
+        outro_start = None
+        if self.outro is not None:
+            gap = int(self.OUTRO_END_GAP * self.out_rate)
+            total = max(total, len(self.outro) + gap)
+            outro_start = total - len(self.outro) - gap
+            logger.info(f"🎧 Outro overlay with fade-in applied. Starts at {outro_start / self.out_rate:.2f} s, "
+                        f"ends at {(outro_start + len(self.outro)) / self.out_rate:.2f} s.")
+        return voice_start, total, outro_start
 
+    def _narration_blocks(self, resampler):
+        with wave.open(self.wav_path, 'rb') as wf:
+            remaining = self.in_frames
+            while remaining > 0:
+                frames = wf.readframes(min(BLOCK_FRAMES, remaining))
+                remaining -= len(frames) // (2 * self.in_channels)
+                block = from_pcm16(frames, self.in_channels)
+                if resampler is not None:
+                    block = resampler.process(block, final=remaining <= 0)
+                yield self._to_output_channels(block)
 
-
+    @staticmethod
+    def _mix_overlay(out, out_start, overlay, overlay_start):
+        '''
+            Adds the part of overlay (placed at overlay_start) that falls into out.
+        '''
+        lo = max(out_start, overlay_start)
+        hi = min(out_start + len(out), overlay_start + len(overlay))
+        if lo < hi:
+            out[lo - out_start:hi - out_start] += overlay[lo - overlay_start:hi - overlay_start]
 
     def export_final(self):
-        output_path = self._get_output_path()
+        output_path = self.output_path
+        if self.in_rate == self.out_rate:
+            resampler = None
+            voice_frames = self.in_frames
+        else:
+            resampler = self.resampler(self.in_rate, self.out_rate, self.in_channels)
+            voice_frames = resampler.output_length(self.in_frames)
+        voice_start, total, outro_start = self.layout(voice_frames)
+
         try:
-            # Set to standard uncompressed 16-bit stereo at 44.1kHz
-            raw = self.base.set_frame_rate(44100).set_channels(2).set_sample_width(2)
+            with WavStreamWriter(output_path, self.out_rate, channels=self.out_channels) as writer:
+                position = 0
+
+                def emit(block):
+                    nonlocal position
+                    if self.intro is not None:
+                        self._mix_overlay(block, position, self.intro, 0)
+                    if self.outro is not None:
+                        self._mix_overlay(block, position, self.outro, outro_start)
+                    writer.write(to_pcm16(block))
+                    position += len(block)
+
+                # Lead-in under the intro
+                for start in range(0, voice_start, BLOCK_FRAMES):
+                    emit(np.zeros((min(BLOCK_FRAMES, voice_start - start), self.out_channels), dtype=np.float32))
+
+                for block in self._narration_blocks(resampler):
+                    emit(block)
 
-            with wave.open(output_path, 'wb') as wf:
-                wf.setnchannels(raw.channels)
-                wf.setsampwidth(raw.sample_width)
-                wf.setframerate(raw.frame_rate)
-                wf.writeframes(raw._data)
+                # Tail after the voice, where the intro may still be playing and the outro ends
+                while position < total:
+                    emit(np.zeros((min(BLOCK_FRAMES, total - position), self.out_channels), dtype=np.float32))
 
-            logger.info(f"✅ Final WAV saved to: {output_path} (length: {len(raw) / 1000:.2f} seconds)")
+            logger.info(f"✅ Final WAV saved to: {output_path} (length: {total / self.out_rate:.2f} seconds)")
         except Exception as e:
-            logger.error(f"❌ Failed to export WAV using wave module: {e}")
+            logger.error(f"❌ Failed to export WAV: {e}")
             raise
 
     def _get_output_path(self):
@@ -1,18 +1,66 @@
 import os
-import re
-import string
 import sys
-from bs4 import BeautifulSoup
+import time
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from ebooklib import epub
 import ebooklib
-import inflect
 import logging
-import unicodedata
+
+from epub_spine import SpineReader
+from html_text import html_to_text
+from job_store import jobs, ProgressReporter
+from lexicon import lexicons
+from metrics import text_stage_seconds
+from text_normalizer import normalizer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = max(1, int(os.environ.get("TTS_INGEST_WORKERS", os.cpu_count() or 1)))
+# A spawned process imports the app again (a few seconds), while cleaning runs at several MB/s:
+# smaller books are done before a pool would have started
+PARALLEL_MIN_BYTES = int(float(os.environ.get("TTS_INGEST_PARALLEL_MIN_MB", 16)) * 1024 * 1024)
+
+
+def clean_chapter(content, skiplinks, html_backend, lexicon_paths):
+    '''
+        chap2text, prep_text and apply_customwords for one spine document, at module level so a
+        process pool can run it. Returns the stage timings with the text: pool processes exit
+        without flushing their metrics, so the parent records them.
+    '''
+    timings = {}
+    start = time.perf_counter()
+    text = html_to_text(content, skiplinks, html_backend)
+    timings["chap2text"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    text = normalizer.prep_text(text)
+    timings["prep_text"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    text = lexicons.get(*lexicon_paths).apply(text)
+    timings["apply_customwords"] = time.perf_counter() - start
+    return text, timings
+
+
+def ordered_imap(executor, func, tasks, window):
+    '''
+        Like executor.map over argument tuples, but takes tasks from the iterator only as results
+        are handed out, so at most window tasks and results are held at any time.
+    '''
+    pending = deque()
+    for args in tasks:
+        pending.append(executor.submit(func, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
 class TextIn:
-    def __init__(self, source, start, end, skiplinks, debug, title, author, chapters_per_file=1, customwords="custom_words.txt", intro="", outtro=""):
+    def __init__(self, source, start, end, skiplinks, debug, title, author, chapters_per_file=1, customwords="custom_words.txt", customphonemes="custom_phonemes.txt", intro="", outtro="", html_backend=None, workers=None, job_id=None, lazy=False):
 
         self.source = source
         self.bookname = os.path.splitext(os.path.basename(source))[0]
@@ -24,6 +72,13 @@ class TextIn:
         self.chapters_to_read = []
         self.chapters_per_file = chapters_per_file
         self.customwords = customwords
+        self.customphonemes = customphonemes
+        self.html_backend = html_backend
+        self.workers = max(1, int(workers or INGEST_WORKERS))
+        # Set when running as a background ingest job, progress is published for it
+        self.job_id = job_id
+        # Stream the spine from the zip and write parts as they fill up, instead of loading the whole book
+        self.lazy = lazy
         self.title = title
         self.author = author
         self.pronunciation = self.set_custom_dict()
@@ -34,7 +89,11 @@ class TextIn:
         self.outtro = outtro
         logger.info(f"Initialized TextIn with source: {source}, chapters {start} to {end}")        
         # Set up the source and automatically process chapters if EPUB
-        if source.endswith('.epub'):
+        if source.endswith('.epub') and lazy:
+            self.book = None
+            self.sourcetype = 'epub'
+            self.stream_chapters_epub()
+        elif source.endswith('.epub'):
             self.book = epub.read_epub(source)
             self.sourcetype = 'epub'
             self.get_chapters_epub()  # Automatically execute get_chapters_epub
@@ -52,16 +111,44 @@ class TextIn:
         item_map = {item.get_id(): item for item in self.book.get_items_of_type(ebooklib.ITEM_DOCUMENT)}
         ordered_ids = [item[0] for item in self.book.spine]
         
-        chapter_num = 1
-        for uid in ordered_ids:
-            if uid not in item_map:
-                continue
-            
-            content = item_map[uid].get_content()
-            text = self.chap2text(content)
-            text = self.prep_text(text)
-            text = self.apply_customwords(text)
+        contents = [item_map[uid].get_content() for uid in ordered_ids if uid in item_map]
+        progress = ProgressReporter(jobs, self.job_id, chunks_total=len(contents))
+
+        size = sum(len(content) for content in contents)
+        self.chapters_to_read.extend(self.iter_chapters(contents, len(contents), size, progress))
+        self.save_combined_chapters()
+        progress.update(len(contents), 0.0, stage="done", force=True)
 
+    def stream_chapters_epub(self):
+        '''
+            Lazy counterpart of get_chapters_epub: reads the spine documents one at a time from
+            the zip and writes each part as soon as its chapters_per_file chapters are done, so
+            at most about one part is held in memory. chapters_to_read stays empty.
+        '''
+        spine = SpineReader(self.source)
+        progress = ProgressReporter(jobs, self.job_id, chunks_total=len(spine))
+
+        part_number = 1
+        chunk = []
+        for chapter in self.iter_chapters(spine, len(spine), spine.size, progress):
+            chunk.append(chapter)
+            if len(chunk) == self.chapters_per_file:
+                self.save_part(part_number, chunk)
+                part_number += 1
+                chunk = []
+        if chunk:
+            self.save_part(part_number, chunk)
+        progress.update(len(spine), 0.0, stage="done", force=True)
+
+    def iter_chapters(self, contents, count, size, progress):
+        '''
+            Yields (chapter number, text) in reading order for the spine documents in contents.
+            Documents shorter than 150 characters don't count as chapters, and only chapters
+            from start to end are yielded. With end 999, end becomes the last chapter number.
+        '''
+        chapter_num = 1
+        for done, text in enumerate(self.clean_chapters(contents, count, size), 1):
+            progress.update(done, 0.0, stage="ingesting")
             if len(text) < 150:
                 continue
 
@@ -69,7 +156,7 @@ class TextIn:
                 chapter_num += 1
                 continue
 
-            self.chapters_to_read.append((chapter_num, text))
+            yield (chapter_num, text)
 
             if self.debug:
                 logger.info(f"Chapter {chapter_num} length: {len(text)}")
@@ -79,7 +166,30 @@ class TextIn:
         if self.end == 999:
             self.end = chapter_num - 1
 
-        self.save_combined_chapters()
+    def clean_chapters(self, contents, count, size):
+        '''
+            Yields the cleaned text of each spine document in reading order, reading contents lazily.
+            Books over TTS_INGEST_PARALLEL_MIN_MB are spread over TTS_INGEST_WORKERS processes.
+        '''
+        lexicon_paths = (os.path.abspath(self.customwords), os.path.abspath(self.customphonemes))
+        workers = min(self.workers, count)
+        # Daemonic processes may not start children
+        if workers < 2 or size < PARALLEL_MIN_BYTES or mp.current_process().daemon:
+            results = (clean_chapter(content, self.skiplinks, self.html_backend, lexicon_paths) for content in contents)
+            yield from self._record_timings(results)
+            return
+
+        logger.info(f"Processing {count} spine documents ({size / 1024 / 1024:.1f} MB) with {workers} processes")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as executor:
+            tasks = ((content, self.skiplinks, self.html_backend, lexicon_paths) for content in contents)
+            yield from self._record_timings(ordered_imap(executor, clean_chapter, tasks, window=workers * 2))
+
+    @staticmethod
+    def _record_timings(results):
+        for text, timings in results:
+            for stage, seconds in timings.items():
+                text_stage_seconds.observe(seconds, stage=stage)
+            yield text
 
 
     def save_combined_chapters(self):
@@ -90,12 +200,18 @@ class TextIn:
 
         for i in range(0, len(self.chapters_to_read), self.chapters_per_file):
             chunk = self.chapters_to_read[i:i + self.chapters_per_file]
-            start_chapter = chunk[0][0]
-            end_chapter = chunk[-1][0]
-            combined_text = "\n\n".join(chapter[1] for chapter in chunk)
-            self.save_chapter_to_file(part_number, start_chapter, end_chapter, combined_text)
+            self.save_part(part_number, chunk)
             part_number += 1  # Increment part number
 
+    def save_part(self, part_number, chunk):
+        '''
+            Saves a group of (chapter number, text) tuples as one part file.
+        '''
+        start_chapter = chunk[0][0]
+        end_chapter = chunk[-1][0]
+        combined_text = "\n\n".join(chapter[1] for chapter in chunk)
+        self.save_chapter_to_file(part_number, start_chapter, end_chapter, combined_text)
+
     def save_chapter_to_file(self, part_number, start_chapter, end_chapter, text):
         '''
             Saves the cleaned chapter text to a file in the clean_text directory with a description.
@@ -106,175 +222,60 @@ class TextIn:
             f.write(self.intro + "\n\n" + text + "\n" + self.outtro)
         logger.info(f"Part {part_number} (Chapters {start_chapter} to {end_chapter}) saved as {filename}.")
 
-    def apply_customwords(self, text):    
+    @text_stage_seconds.timed(stage="apply_customwords")
+    def apply_customwords(self, text):
         '''
-            Uses custom pronunciation as provided by the configuration item custom_words.txt
+            Uses custom pronunciation as provided by the configuration items custom_words.txt
+            and custom_phonemes.txt. Keys may span several words and contain punctuation.
             Referenced by get_chapters_epub
             Dependency: set_custom_dict
-            Packages required: re
         '''
-        def replace_word(match):
-            word = match.group(0)
-            clean_word = re.sub(r'[^\w\s]', '', word.lower())
-            return self.pronunciation.get(clean_word, word)
-        
-        modified_text = re.sub(r'\b\w+\b', replace_word, text)
-        return modified_text
+        return self.pronunciation.apply(text)
+
     def expand_abbreviations(self, text):
         '''
             Expands common abbreviations in text.
         '''
-        text = re.sub(r'\bMr\.\s', 'Mister ', text)
-        text = re.sub(r'\bMrs\.\s', 'Missus ', text)
-        text = re.sub(r'\bMs\.\s', 'Miss ', text)
-        text = re.sub(r'\bSt\.\s', 'Saint ', text)
-        return text
+        return normalizer.expand_abbreviations(text)
+
     def expand_ordinals(self, text):
         '''
             Converts ordinal numbers (e.g., 3rd, 15th, 22nd) into their word equivalents.
             Handles cases where there is an unintended space (e.g., "5 th" instead of "5th").
         '''
-        p = inflect.engine()
-
-        def replace_ordinal(match):
-            number = int(match.group(1))  # Extract the numeric part
-            return p.ordinal(number)  # Convert number to words (e.g., "5th" -> "fifth")
+        return normalizer.expand_ordinals(text)
 
-        # Fix cases where there's a space between the number and ordinal suffix
-        text = re.sub(r'\b(\d+)\s*(st|nd|rd|th)\b', replace_ordinal, text)
-
-        return text
-        
+    @text_stage_seconds.timed(stage="prep_text")
     def prep_text(self, text):
         '''
         Enhanced text cleaner for TTS operations.
         - Expands abbreviations and ordinals
         - Removes repeated chapter titles and summaries
         - Applies paragraph formatting
+        Runs the compiled TextNormalizer shared by the whole process.
         '''
-        # --- Expand abbreviations and ordinals ---
-        text = self.expand_abbreviations(text)
-        text = self.expand_ordinals(text)
-
-        # --- Normalize smart quotes ---
-        text = (
-            text.replace('’', "'")
-                .replace('‘', "'")
-                .replace('“', '"')
-                .replace('”', '"')
-        )
-
-        # --- Clean and replace punctuation ---
-        text = text.replace("—", ", ").replace("--", ", ").replace(";", ", ").replace(":", ", ").replace("''", ", ")
-        text = (
-            text.replace("◇", "")
-                .replace(" . . . ", ", ")
-                .replace("... ", ", ")
-                .replace("«", " ")
-                .replace("»", " ")
-                .replace("[", "")
-                .replace("]", "")
-                .replace("&", " and ")
-                .replace(" GNU ", " new ")
-                .replace("*", " ")
-                .strip()
-        )
-        text = self.normalize_unicode_to_ascii(text)
-
-        # --- Remove first line if it's the intro ---
-        lines = text.splitlines()
-        if lines and "Wizarding Wireless America" in lines[0]:
-            lines = lines[1:]  # Remove the intro line
-        text = "\n".join(lines)
-
-        # --- Remove non-allowed characters ---
-        allowed_chars = string.ascii_letters + string.digits + "-,.!?' \n"
-        text = ''.join(c for c in text if c in allowed_chars)
-
-        # --- Add paragraph breaks after sentence punctuation ---
-        text = re.sub(r'(?<=[.!?])\s+(?=[A-Z])', r'\n', text)
-
-        return text
-
-
-
-    
+        return normalizer.prep_text(text)
 
+    @text_stage_seconds.timed(stage="chap2text")
     def chap2text(self, chap):
         '''
         Extracts and flattens visible text from a chapter.
         Fixes broken line breaks in the middle of sentences.
+        The backend is lxml by default, html_backend="bs4" selects the BeautifulSoup reference.
         '''
-        soup = BeautifulSoup(chap, 'html.parser')
-        blacklist = ['[document]', 'noscript', 'header', 'html', 'meta', 'head', 'input', 'script', 'style']
-
-        if self.skiplinks:
-            for a in soup.find_all('a', href=True):
-                a.extract()
-
-        # Remove footnote-style anchors (digits only)
-        for a in soup.find_all('a', href=True):
-            if a.text.strip().isdigit():
-                a.extract()
-
-        # Extract visible strings
-        texts = []
-        for tag in soup.find_all(text=True):
-            if tag.parent.name in blacklist:
-                continue
-            txt = tag.strip()
-            if txt:
-                texts.append(txt)
-
-        # Join all the visible text parts
-        output = ' '.join(texts)
-
-        # Normalize whitespace: collapse multiple spaces, fix artificial newlines
-        output = re.sub(r'\s+', ' ', output)
-
-        return output.strip()
+        return html_to_text(chap, self.skiplinks, self.html_backend)
 
     def normalize_unicode_to_ascii(self, text: str) -> str:
         """
         Normalize Unicode characters to ASCII equivalents.
         Uses NFKC normalization and additional manual replacements.
         """
-        # Apply Unicode normalization (NFKC) to convert fullwidth and compatibility chars to ASCII
-        text = unicodedata.normalize('NFKC', text)
-
-        # Additional manual replacements if needed:
-        replacements = {
-            '“': '"',
-            '”': '"',
-            '‘': "'",
-            '’': "'",
-            '—': '-',
-            '–': '-',
-            '…': '...',
-            '•': '*',
-            '‹': '<',
-            '›': '>',
-            '«': '<<',
-            '»': '>>',
-            '￥': '¥',
-            ' ': ' ',  # non-breaking space to space
-            # Add any other you want here
-        }
-        for k, v in replacements.items():
-            text = text.replace(k, v)
-
-        return text
-
-      
+        return normalizer.normalize_unicode_to_ascii(text)
 
     def set_custom_dict(self):
         '''
             Referenced by class init
             Dependency: None
-        ''' 
-        pronunciation_dict = {}
-        with open(self.customwords, 'r') as f:
-            for line in f:
-                word, pronunciation = line.strip().split('|', maxsplit=1)
-                pronunciation_dict[word.lower()] = pronunciation
-        return pronunciation_dict
\ No newline at end of file
+            The lexicon is shared by the process and reloads itself when a file changes.
+        '''
+        return lexicons.get(self.customwords, self.customphonemes)
@@ -0,0 +1,204 @@
+import heapq
+import os
+import time
+
+from job_store import jobs
+
+POLICIES = ("sjf", "fair", "fifo")
+PRIORITY_CLASSES = {"high": 0, "normal": 1, "low": 2}
+DEFAULT_PRIORITY = "normal"
+
+SCHEDULER_POLICY = os.environ.get("TTS_SCHEDULER", "sjf")
+# Estimated render seconds forgiven per second a job has waited, so long jobs are not starved
+AGING_RATE = float(os.environ.get("TTS_SCHEDULER_AGING", 0.5))
+# A waiting job moves up one priority class per this many seconds
+CLASS_AGE_SECONDS = float(os.environ.get("TTS_SCHEDULER_CLASS_AGE", 3600))
+# Render speed assumed before any job of a voice has finished
+DEFAULT_CHARS_PER_SECOND = float(os.environ.get("TTS_DEFAULT_CPS", 60))
+HISTORY_JOBS = 200  # finished jobs used for speed measurements and fair-share accounting
+FAIR_SHARE_WINDOW = 6 * 3600
+
+
+def priority_rank(value):
+    value = str(value or DEFAULT_PRIORITY).strip().lower()
+    if value.isdigit():
+        return min(int(value), max(PRIORITY_CLASSES.values()))
+    if value not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority '{value}', expected one of {', '.join(PRIORITY_CLASSES)}")
+    return PRIORITY_CLASSES[value]
+
+
+class Scheduler:
+    '''
+    Decides which queued job a free worker renders next.
+    A job's cost is its clean_text character count divided by the characters per
+    second measured for its voice on finished jobs. Jobs are ordered by priority
+    class first, then by policy:
+        sjf   shortest estimated job first
+        fair  the book (author and title) that received the least render time recently
+        fifo  submission order
+    Waiting time is credited against the cost and eventually lifts the class, so
+    nothing waits forever behind a stream of short or high priority jobs.
+    '''
+    def __init__(self, store=jobs, policy=SCHEDULER_POLICY, aging_rate=AGING_RATE, class_age=CLASS_AGE_SECONDS):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduler policy '{policy}', expected one of {', '.join(POLICIES)}")
+        self.store = store
+        self.policy = policy
+        self.aging_rate = aging_rate
+        self.class_age = class_age
+
+    def submit(self, config, kind="tts"):
+        '''
+            Stores a job. TTS jobs carry the size of their text, which their cost estimate is based on;
+            ingest jobs are estimated at zero, they take seconds next to a render.
+        '''
+        priority_rank(config.get("priority"))  # reject unknown classes before the job is stored
+        chars = 0
+        if kind == "tts":
+            with open(config["filename"], "r", encoding="utf-8") as f:
+                chars = len(f.read())
+        return self.store.enqueue(config, chars=chars, kind=kind)
+
+    @staticmethod
+    def voice(job):
+        return job["config"].get("voice") or ""
+
+    @staticmethod
+    def book(job):
+        config = job["config"]
+        return (config.get("author", ""), config.get("title", ""))
+
+    def rates(self, history):
+        '''
+            Measured characters per second per voice, plus an overall rate under None.
+        '''
+        totals = {}
+        for job in history:
+            # Retried jobs resumed part of their work, their duration says little about speed
+            if job["attempts"] != 1 or not job["chars"]:
+                continue
+            elapsed = job["finished_at"] - job["started_at"]
+            if elapsed <= 0:
+                continue
+            for key in (self.voice(job), None):
+                chars, seconds = totals.get(key, (0, 0.0))
+                totals[key] = (chars + job["chars"], seconds + elapsed)
+        rates = {key: chars / seconds for key, (chars, seconds) in totals.items()}
+        rates.setdefault(None, DEFAULT_CHARS_PER_SECOND)
+        return rates
+
+    def estimate(self, job, rates):
+        '''
+            Estimated render time of job in seconds.
+        '''
+        rate = rates.get(self.voice(job)) or rates[None]
+        return job["chars"] / rate
+
+    def order(self, queued, now=None, history=None, running=None, limit=None):
+        '''
+            Returns the queued jobs in the order they would be started, each paired with its estimate.
+            With limit only that many jobs from the front of the order are returned.
+        '''
+        now = now or time.time()
+        history = self.store.by_state("done", limit=HISTORY_JOBS, newest_first=True) if history is None else history
+        running = self.store.by_state("running") if running is None else running
+        rates = self.rates(history)
+
+        # Render seconds each book received recently, only consulted by the fair policy
+        served = {}
+        for job in history:
+            if job["finished_at"] >= now - FAIR_SHARE_WINDOW:
+                served[self.book(job)] = served.get(self.book(job), 0.0) + job["finished_at"] - job["started_at"]
+        for job in running:
+            served[self.book(job)] = served.get(self.book(job), 0.0) + self.estimate(job, rates)
+
+        pending = [(job, self.estimate(job, rates)) for job in queued]
+        if self.policy == "fair":
+            return self._fair_order(pending, served, now, limit)
+        # sjf and fifo keys do not depend on the jobs picked before, one sort orders the queue
+        key = lambda item: self._sort_key(*item, served, now)
+        return sorted(pending, key=key) if limit is None else heapq.nsmallest(limit, pending, key=key)
+
+    def _fair_order(self, pending, served, now, limit):
+        '''
+            The fair order without rescanning the queue for every pick: a heap of jobs per book,
+            keyed without the book's share, and a heap of the first job of every book keyed with
+            it. Taking a job only changes the share of its own book, so only that book's next
+            job is pushed again.
+        '''
+        books = {}
+        for job, estimate in pending:
+            rank, credit, job_id = self._sort_key(job, estimate, {}, now)
+            books.setdefault(self.book(job), []).append((rank, credit, job_id, job, estimate))
+
+        def head(book):
+            rank, credit, job_id, _, _ = books[book][0]
+            return (rank, served.get(book, 0.0) + credit, job_id, book)
+
+        for queue in books.values():
+            heapq.heapify(queue)
+        heads = [head(book) for book in books]
+        heapq.heapify(heads)
+
+        ordered = []
+        while heads and (limit is None or len(ordered) < limit):
+            book = heapq.heappop(heads)[-1]
+            _, _, _, job, estimate = heapq.heappop(books[book])
+            ordered.append((job, estimate))
+            served[book] = served.get(book, 0.0) + estimate
+            if books[book]:
+                heapq.heappush(heads, head(book))
+        return ordered
+
+    def _sort_key(self, job, estimate, served, now):
+        waited = max(0.0, now - job["created_at"])
+        rank = max(0, priority_rank(job["config"].get("priority")) - int(waited // self.class_age))
+        credit = self.aging_rate * waited
+        if self.policy == "sjf":
+            return (rank, estimate - credit, job["id"])
+        if self.policy == "fair":
+            return (rank, served.get(self.book(job), 0.0) - credit, job["id"])
+        return (rank, job["id"])
+
+    def choose(self, queued):
+        job, _ = self.order(queued, limit=1)[0]
+        return job
+
+    def forecast(self, workers, now=None, progress=None):
+        '''
+            Estimated (start, finish) timestamps of every running and queued job, assuming
+            workers render in the current order and estimates hold. Running jobs that
+            published progress finish when their own remaining-time estimate says.
+            Returns the queued jobs in scheduled order and a dict of job id -> (start, finish).
+        '''
+        now = now or time.time()
+        history = self.store.by_state("done", limit=HISTORY_JOBS, newest_first=True)
+        running = self.store.by_state("running")
+        rates = self.rates(history)
+
+        eta = {}
+        free_at = []
+        progress = progress or {}
+        for job in running:
+            report = progress.get(job["id"])
+            if report is not None and report["eta"] is not None:
+                finish = max(now, report["updated_at"] + report["eta"])
+            else:
+                finish = max(now, job["started_at"] + self.estimate(job, rates))
+            eta[job["id"]] = (job["started_at"], finish)
+            free_at.append(finish)
+        workers = max(1, workers)
+        free_at = sorted(free_at)[:workers] + [now] * max(0, workers - len(free_at))
+        heapq.heapify(free_at)
+
+        ordered = self.order(self.store.by_state("queued"), now, history, running)
+        for job, estimate in ordered:
+            start = heapq.heappop(free_at)
+            eta[job["id"]] = (start, start + estimate)
+            heapq.heappush(free_at, start + estimate)
+        return [job for job, _ in ordered], eta
+
+
+# Shared by the web app and every worker process
+scheduler = Scheduler()
@@ -0,0 +1,27 @@
+'''
+Imported first by every test module: points the app's runtime state (job
+database, chunk cache, render records, metrics snapshots) at a temporary
+directory before any app module reads its location, and puts the repository
+on sys.path.
+'''
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+RUNTIME_DIR = tempfile.mkdtemp(prefix="tts-tests-")
+# Registered before the app's own atexit flushes, so it runs after them
+atexit.register(shutil.rmtree, RUNTIME_DIR, ignore_errors=True)
+
+os.environ.update({
+    "TTS_POOL_STARTED": "1",
+    "TTS_JOB_DB": os.path.join(RUNTIME_DIR, "jobs.db"),
+    "TTS_CACHE_DIR": os.path.join(RUNTIME_DIR, "chunk_cache"),
+    "TTS_RENDER_DIR": os.path.join(RUNTIME_DIR, "renders"),
+    "TTS_METRICS_DIR": os.path.join(RUNTIME_DIR, "metrics"),
+})
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import support  # noqa: F401  runtime state in a temp dir, repo on sys.path
+
+app = None
+
+
+def setUpModule():
+    # The app keeps its folders next to the working directory, so it runs in a throwaway one
+    global app, workdir, cwd
+    workdir = tempfile.TemporaryDirectory()
+    cwd = os.getcwd()
+    os.chdir(workdir.name)
+    import app as app_module
+    app = app_module
+    # send_from_directory resolves the audio folder against the root path, deployed it is the working directory
+    app.app.root_path = workdir.name
+
+
+def tearDownModule():
+    os.chdir(cwd)
+    workdir.cleanup()
+
+
+class PlayAudioTest(unittest.TestCase):
+    def setUp(self):
+        from wav_stream import WavStreamWriter, to_pcm16
+        os.makedirs(app.AUDIO_FOLDER, exist_ok=True)
+        self.path = os.path.join(app.AUDIO_FOLDER, "book.wav")
+        with WavStreamWriter(self.path, 24000) as writer:
+            writer.write(to_pcm16(np.zeros(24000, dtype=np.float32)))
+        self.size = os.path.getsize(self.path)
+        self.client = app.app.test_client()
+
+    def test_range_request_gets_partial_content(self):
+        response = self.client.get("/audio/play/book.wav", headers={"Range": "bytes=100-1099"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers["Content-Range"], f"bytes 100-1099/{self.size}")
+        self.assertEqual(len(response.data), 1000)
+        response.close()
+
+    def test_open_ended_range(self):
+        response = self.client.get("/audio/play/book.wav", headers={"Range": "bytes=1000-"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers["Content-Range"], f"bytes 1000-{self.size - 1}/{self.size}")
+        response.close()
+
+    def test_whole_file_without_range(self):
+        response = self.client.get("/audio/play/book.wav")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), self.size)
+        response.close()
+
+
+class FindOutputTest(unittest.TestCase):
+    def test_only_task_keys_of_the_file_match(self):
+        from manifest import TaskScratch, task_key
+        root = tempfile.mkdtemp(dir=workdir.name)
+        other = os.path.join(root, task_key("clean_text/book-part_1.txt", "bf_emma"), "output.wav")
+        os.makedirs(os.path.dirname(other))
+        open(other, "wb").close()
+        self.assertIsNone(TaskScratch.find_output("book.txt", root=root))
+
+        own = os.path.join(root, task_key("clean_text/book.txt", "bf_emma"), "output.wav")
+        os.makedirs(os.path.dirname(own))
+        open(own, "wb").close()
+        self.assertEqual(TaskScratch.find_output("book.txt", root=root), own)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+import support  # noqa: F401  runtime state in a temp dir, repo on sys.path
+
+from chunk_cache import ChunkCache
+
+
+class ChunkCacheTest(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.cache = ChunkCache(root=workdir.name)
+        self.key = self.cache.key("Hello there.", "bf_emma", 1.0, "kokoro", 24000)
+        self.frames = bytes(range(256)) * 40
+        self.cache.store(self.key, self.frames, 24000)
+
+    def test_hit(self):
+        self.assertEqual(self.cache.fetch(self.key), self.frames)
+
+    def test_truncated_entry_is_a_miss_and_removed(self):
+        path = self.cache.path(self.key)
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 1000)
+        self.assertIsNone(self.cache.fetch(self.key))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_corrupt_header_is_a_miss(self):
+        path = self.cache.path(self.key)
+        with open(path, "wb") as f:
+            f.write(b"RIFF")
+        self.assertIsNone(self.cache.fetch(self.key))
+        self.assertFalse(os.path.exists(path))
+
+        # The chunk is synthesized again and cached anew
+        self.cache.store(self.key, self.frames, 24000)
+        self.assertEqual(self.cache.fetch(self.key), self.frames)
+
+
+if __name__ == "__main__":
+    unittest.main()
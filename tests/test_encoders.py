@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+import support  # noqa: F401  runtime state in a temp dir, repo on sys.path
+
+from encoders import encode
+from wav_stream import WavStreamWriter, from_pcm16, to_pcm16
+
+
+class EncodeTest(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        rng = np.random.default_rng(0)
+        self.samples = rng.integers(-32768, 32768, 100000).astype("<i2")
+        self.wav_path = os.path.join(workdir.name, "book.wav")
+        with WavStreamWriter(self.wav_path, 24000) as writer:
+            writer.write(self.samples.tobytes())
+
+    def test_flac_keeps_every_sample(self):
+        flac_path = encode(self.wav_path, "flac", keep_wav=True)
+        decoded, rate = sf.read(flac_path, dtype="int16")
+        self.assertEqual(rate, 24000)
+        np.testing.assert_array_equal(decoded, self.samples)
+
+    def test_float_conversions_match_libsndfile(self):
+        # Floats read by soundfile and floats from from_pcm16 turn back into the same PCM
+        audio, _ = sf.read(self.wav_path, dtype="float32")
+        self.assertEqual(to_pcm16(audio), self.samples.tobytes())
+        self.assertEqual(to_pcm16(from_pcm16(self.samples.tobytes())), self.samples.tobytes())
+
+    def test_to_pcm16_clips(self):
+        pcm = np.frombuffer(to_pcm16(np.array([-2.0, -1.0, 1.0, 2.0], dtype=np.float32)), dtype="<i2")
+        np.testing.assert_array_equal(pcm, [-32768, -32768, 32767, 32767])
+
+
+if __name__ == "__main__":
+    unittest.main()
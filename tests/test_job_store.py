@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+import support  # noqa: F401  runtime state in a temp dir, repo on sys.path
+from job_store import JobStore
+from wave_gen import job_task_key
+
+
+class ClaimTest(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.store = JobStore(os.path.join(workdir.name, "jobs.db"))
+
+    def enqueue(self, filename, voice="bf_emma", kind="tts"):
+        return self.store.enqueue({"filename": filename, "voice": voice}, kind=kind)
+
+    def claim(self):
+        job = self.store.claim("worker", key=job_task_key)
+        return job["id"] if job else None
+
+    def test_same_file_and_voice_waits_for_the_running_render(self):
+        first = self.enqueue("clean_text/book.txt")
+        second = self.enqueue("clean_text/book.txt")
+        other_voice = self.enqueue("clean_text/book.txt", voice="af_bella")
+        ingest = self.enqueue("uploads/book.epub", kind="ingest")
+
+        self.assertEqual(self.claim(), first)
+        self.assertEqual(self.claim(), other_voice)
+        self.assertEqual(self.claim(), ingest)
+        self.assertIsNone(self.claim())
+
+        self.store.complete(first, "audio/book.wav")
+        self.assertEqual(self.claim(), second)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+
+import support  # noqa: F401  runtime state in a temp dir, repo on sys.path
+
+from lexicon import PronunciationLexicon
+
+
+class PronunciationLexiconTest(unittest.TestCase):
+    def lexicon(self, *lines):
+        handle, path = tempfile.mkstemp(suffix=".txt")
+        with os.fdopen(handle, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self.addCleanup(os.remove, path)
+        return PronunciationLexicon([path])
+
+    def test_punctuation_key_stops_at_word_boundary(self):
+        lexicon = self.lexicon("Mr.|mister")
+        self.assertEqual(lexicon.apply("Mr.Smith"), "Mr.Smith")
+        self.assertEqual(lexicon.apply("Mr. Smith"), "mister Smith")
+        self.assertEqual(lexicon.apply("Ask Mr."), "Ask mister")
+        self.assertEqual(lexicon.apply("(Mr.)"), "(mister)")
+
+    def test_word_keys_match_whole_words(self):
+        lexicon = self.lexicon("Hermione|Her-my-oh-nee", "A.I.|ay eye")
+        self.assertEqual(lexicon.apply("hermione's wand"), "Her-my-oh-nee's wand")
+        self.assertEqual(lexicon.apply("Hermiones"), "Hermiones")
+        self.assertEqual(lexicon.apply("The A.I. spoke"), "The ay eye spoke")
+        self.assertEqual(lexicon.apply("A.I.s"), "A.I.s")
+
+
+if __name__ == "__main__":
+    unittest.main()
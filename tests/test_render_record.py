@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import support  # noqa: F401  runtime state in a temp dir, repo on sys.path
+
+from chunk_cache import ChunkCache
+from encoders import encode
+from manifest import RenderRecord
+from wav_stream import WavStreamWriter, to_pcm16
+
+SAMPLE_RATE = 24000
+SETTINGS = {"sample_rate": SAMPLE_RATE, "speed": 1.0}
+
+
+class FlacSourceTest(unittest.TestCase):
+    def test_reused_chunks_match_the_cache(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        cache = ChunkCache(root=os.path.join(workdir.name, "cache"))
+        rng = np.random.default_rng(0)
+
+        # Chunks as a render produces them: synthesized floats, cached and appended as PCM
+        texts = [f"Sentence number {i}." for i in range(5)]
+        wav_path = os.path.join(workdir.name, "book.wav")
+        frames = []
+        with WavStreamWriter(wav_path, SAMPLE_RATE) as writer:
+            for text in texts:
+                pcm = to_pcm16(rng.uniform(-0.9, 0.9, rng.integers(2000, 9000)).astype(np.float32))
+                cache.store(cache.key(text, "bf_emma", 1.0, "kokoro", SAMPLE_RATE), pcm, SAMPLE_RATE)
+                writer.write(pcm)
+                frames.append(len(pcm) // 2)
+        flac_path = encode(wav_path, "flac")
+
+        record = RenderRecord("book.txt", "bf_emma", root=os.path.join(workdir.name, "renders"))
+        record.save([(text, (text,)) for text in texts], frames, SETTINGS, [wav_path, flac_path])
+        self.assertEqual(record.data["source"]["path"], flac_path)
+
+        previous = record.reader(SETTINGS)
+        self.addCleanup(previous.close)
+        for text in texts:
+            cached = cache.fetch(cache.key(text, "bf_emma", 1.0, "kokoro", SAMPLE_RATE))
+            self.assertEqual(previous.read(text), cached)
+
+
+if __name__ == "__main__":
+    unittest.main()
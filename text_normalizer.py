@@ -0,0 +1,99 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+import inflect
+
+ABBREVIATIONS = {"Mr": "Mister ", "Mrs": "Missus ", "Ms": "Miss ", "St": "Saint "}
+
+# prep_text's chained replacements, in their original order: each removal can form
+# a match for a later step (◇ inside a spaced ellipsis, "[" before " GNU "...).
+# The spaced ellipsis uses non-breaking spaces, as in the source EPUBs.
+PUNCTUATION_REPLACEMENTS = (
+    ("’", "'"), ("‘", "'"), ("“", '"'), ("”", '"'),
+    ("—", ", "), ("--", ", "), (";", ", "), (":", ", "), ("''", ", "),
+    ("◇", ""), ("\xa0.\xa0.\xa0. ", ", "), ("... ", ", "),
+    ("«", " "), ("»", " "), ("[", ""), ("]", ""), ("&", " and "),
+    (" GNU ", " new "), ("*", " "),
+)
+# What normalize_unicode_to_ascii maps after NFKC
+UNICODE_REPLACEMENTS = (
+    ("“", '"'), ("”", '"'), ("‘", "'"), ("’", "'"),
+    ("—", "-"), ("–", "-"), ("…", "..."), ("•", "*"),
+    ("‹", "<"), ("›", ">"), ("«", "<<"), ("»", ">>"),
+    ("￥", "¥"), ("\xa0", " "),
+)
+
+INTRO_MARKER = "Wizarding Wireless America"
+
+
+def replace_all(text, replacements):
+    for old, new in replacements:
+        text = text.replace(old, new)
+    return text
+
+
+def word_before(text, position):
+    '''
+        True when a regex \\b would not hold before position, i.e. a word character precedes it.
+    '''
+    if position == 0:
+        return False
+    previous = text[position - 1]
+    return previous.isalnum() or previous == "_"
+
+
+class TextNormalizer:
+    '''
+    Compiled form of TextIn's text cleaning, built once per process.
+    Regexes are compiled up front and start with a literal or a character class,
+    so re can skip ahead instead of trying every position; the leading \\b they
+    replace is checked in the substitution callback. Ordinals come from one
+    inflect engine with memoized results. The output is identical to the
+    step-by-step version, benchmarks/bench_normalizer.py checks this against a
+    copy of it.
+    '''
+    def __init__(self):
+        self.abbreviation_re = re.compile(r"(M(?:rs?|s)|St)\.\s")
+        self.ordinal_re = re.compile(r"(\d+)\s*(?:st|nd|rd|th)\b")
+        self.disallowed_re = re.compile(r"[^A-Za-z0-9\-,.!?' \n]+")
+        self.paragraph_re = re.compile(r"([.!?])\s+(?=[A-Z])")
+        self.inflect = inflect.engine()
+        self.ordinal = lru_cache(maxsize=4096)(self.inflect.ordinal)
+
+    def _abbreviation(self, match):
+        if word_before(match.string, match.start()):
+            return match.group(0)
+        return ABBREVIATIONS[match.group(1)]
+
+    def _ordinal(self, match):
+        if word_before(match.string, match.start()):
+            return match.group(0)
+        return self.ordinal(int(match.group(1)))
+
+    def expand_abbreviations(self, text):
+        return self.abbreviation_re.sub(self._abbreviation, text)
+
+    def expand_ordinals(self, text):
+        return self.ordinal_re.sub(self._ordinal, text)
+
+    def normalize_unicode_to_ascii(self, text):
+        return replace_all(unicodedata.normalize("NFKC", text), UNICODE_REPLACEMENTS)
+
+    def prep_text(self, text):
+        text = self.expand_abbreviations(text)
+        text = self.expand_ordinals(text)
+        text = replace_all(text, PUNCTUATION_REPLACEMENTS).strip()
+        text = self.normalize_unicode_to_ascii(text)
+
+        lines = text.splitlines()
+        if lines and INTRO_MARKER in lines[0]:
+            lines = lines[1:]
+        text = "\n".join(lines)
+
+        text = self.disallowed_re.sub("", text)
+        return self.paragraph_re.sub("\\1\n", text)
+
+
+# One per process, shared by every TextIn
+normalizer = TextNormalizer()
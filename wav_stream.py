@@ -0,0 +1,132 @@
+import os
+import struct
+import time
+
+import numpy as np
+
+HEADER_SIZE = 44
+# Full scale of 16-bit PCM in libsndfile's convention (float = int / 32768), used by every
+# conversion here so audio passing through soundfile and these helpers keeps its samples
+PCM_SCALE = 32768
+# Declared data size for a stream whose length is not known yet
+STREAMING_DATA_SIZE = 0xFFFFFFFF - 36
+
+
+def to_pcm16(audio):
+    '''
+        Converts float audio in [-1, 1] to little-endian 16-bit PCM bytes.
+    '''
+    audio = np.asarray(audio, dtype=np.float32)
+    return np.clip((audio * PCM_SCALE).round(), -PCM_SCALE, PCM_SCALE - 1).astype("<i2").tobytes()
+
+
+def from_pcm16(pcm, channels=1):
+    '''
+        Converts little-endian 16-bit PCM (bytes or an int16 array) to float32 frames.
+    '''
+    if isinstance(pcm, np.ndarray):
+        samples = pcm
+    else:
+        samples = np.frombuffer(pcm, dtype="<i2")
+    return (samples.astype(np.float32) / np.float32(PCM_SCALE)).reshape(-1, channels)
+
+
+def wav_header(data_size, sample_rate, channels=1, sampwidth=2):
+    block_align = channels * sampwidth
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, sampwidth * 8,
+        b"data", data_size
+    )
+
+
+class WavStreamWriter:
+    '''
+    Appends PCM to a WAV file as it is produced and patches the RIFF header
+    when flushed or closed, so only the chunk being written is held in memory.
+    With resume_frames the file is truncated to that many frames and reopened
+    for appending instead of being started over.
+    '''
+    def __init__(self, path, sample_rate, channels=1, sampwidth=2, resume_frames=0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sampwidth = sampwidth
+        self.block_align = channels * sampwidth
+
+        if resume_frames and os.path.exists(path):
+            self._file = open(path, "r+b")
+            self._file.truncate(HEADER_SIZE + resume_frames * self.block_align)
+            self.frames = resume_frames
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(wav_header(0, sample_rate, channels, sampwidth))
+            self.frames = 0
+
+    @property
+    def data_size(self):
+        return self.frames * self.block_align
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    def write(self, pcm):
+        self._file.write(pcm)
+        self.frames += len(pcm) // self.block_align
+
+    def flush(self):
+        '''
+            Patches the header to the current length, so readers of the
+            growing file always see a valid WAV.
+        '''
+        self._file.seek(0)
+        self._file.write(wav_header(self.data_size, self.sample_rate, self.channels, self.sampwidth))
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def follow_wav(path, poll=0.5, idle_timeout=60, block_size=65536):
+    '''
+        Yields a WAV stream of a file that is still being written by WavStreamWriter:
+        a header with an open-ended length, then the PCM already on disk, then new
+        PCM as it is appended. Stops once the writer moved the file away and
+        everything was sent, or when the file stops growing for idle_timeout seconds.
+    '''
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            return
+        channels, sample_rate = struct.unpack("<HI", header[22:28])
+        sampwidth = struct.unpack("<H", header[34:36])[0] // 8
+        yield wav_header(STREAMING_DATA_SIZE, sample_rate, channels, sampwidth)
+
+        block_align = channels * sampwidth
+        idle_since = time.monotonic()
+        while True:
+            size = os.fstat(f.fileno()).st_size
+            if size < f.tell():
+                return  # the render restarted and truncated the file
+            # Whole frames only, the writer may be mid-chunk
+            available = (size - f.tell()) // block_align * block_align
+            if available:
+                yield f.read(min(available, block_size))
+                idle_since = time.monotonic()
+                continue
+            if not os.path.exists(path) or time.monotonic() - idle_since > idle_timeout:
+                return
+            time.sleep(poll)
@@ -1,26 +1,170 @@
 import os
-import wave
+import time
+import atexit
 import logging
 import json
 from datetime import datetime
 from typing import Dict, Any
-from queue import Queue
-from threading import Thread
+import multiprocessing as mp
+from collections import deque
+from threading import Thread, Lock, Event
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from mutagen.wave import WAVE
-from nltk.tokenize import PunktSentenceTokenizer
-import soundfile as sf
 
+import torch
 from kokoro import KModel, KPipeline
+from kokoro.pipeline import LANG_CODES
 
 
 from postprocessor import ProductionWav
+from preprocessors import TextIn
+from chunker import Chunker, CHUNK_PHONEMES
+from text_normalizer import normalizer
+from lexicon import lexicons
+from manifest import TaskScratch, RenderRecord, task_key, text_hash
+from chunk_cache import chunk_cache
+from wav_stream import WavStreamWriter, to_pcm16
+from encoders import encode, output_options, parse_flag
+from job_store import jobs, HEARTBEAT_INTERVAL, ProgressReporter
+from scheduler import scheduler
+import metrics
 # Configure logger
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+KOKORO_REPO_ID = "hexgrad/Kokoro-82M"
+SAMPLE_RATE = 24000
+DEFAULT_LANG_CODE = "a"
+# Processes that synthesize the chunks of one file side by side, 1 renders them in the job's worker
+INFERENCE_WORKERS = int(os.environ.get("TTS_INFERENCE_WORKERS", 1))
+
+
+class SerializedG2P:
+    '''
+    Wraps a pipeline's G2P so one text is phonemized at a time. Batches and
+    streams run one pipeline from several threads, and misaki/espeak keep
+    state between calls. Model passes outside the G2P still run side by side.
+    '''
+    def __init__(self, g2p):
+        self.g2p = g2p
+        self._lock = Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            return self.g2p(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.g2p, name)
+
+
+class PipelineRegistry:
+    '''
+    Process-wide cache of warm KPipeline instances keyed by lang_code.
+    Every pipeline shares a single KModel, so the weights are loaded once per
+    process no matter how many languages or tasks use them.
+    '''
+    def __init__(self, repo_id=KOKORO_REPO_ID):
+        self.repo_id = repo_id
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.load_times = {}
+        self._model = None
+        self._pipelines = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def lang_code_for_voice(voice):
+        '''
+            Kokoro voice ids are prefixed with their lang_code (af_bella -> a, bf_emma -> b).
+        '''
+        prefix = (voice or "")[:1].lower()
+        return prefix if prefix in LANG_CODES else DEFAULT_LANG_CODE
+
+    def get(self, lang_code=DEFAULT_LANG_CODE):
+        pipeline = self._pipelines.get(lang_code)
+        if pipeline is not None:
+            return pipeline
+
+        with self._lock:
+            # Another thread may have finished loading while we waited
+            pipeline = self._pipelines.get(lang_code)
+            if pipeline is not None:
+                return pipeline
+
+            if self._model is None:
+                start = time.perf_counter()
+                self._model = KModel(repo_id=self.repo_id).to(self.device).eval()
+                self.load_times["model"] = time.perf_counter() - start
+                logger.info(f"🧩 Loaded Kokoro model on {self.device} in {self.load_times['model']:.2f}s")
+
+            start = time.perf_counter()
+            pipeline = KPipeline(lang_code=lang_code, repo_id=self.repo_id, model=self._model)
+            if getattr(pipeline, "g2p", None) is not None:
+                pipeline.g2p = SerializedG2P(pipeline.g2p)
+            self.load_times[lang_code] = time.perf_counter() - start
+            logger.info(f"🧩 Loaded pipeline '{lang_code}' in {self.load_times[lang_code]:.2f}s")
+
+            self._pipelines[lang_code] = pipeline
+            return pipeline
+
+    def for_voice(self, voice):
+        return self.get(self.lang_code_for_voice(voice))
+
+
+# Shared by the queue worker and the synchronous /generate-tts route
+pipelines = PipelineRegistry()
+
+
+def synthesize_chunk(pipeline, text, voice, speed):
+    '''
+        Runs one chunk through the pipeline and returns its audio as a single array.
+        Kokoro splits chunks that exceed its context itself, so every segment is kept.
+    '''
+    with metrics.chunk_synthesis_seconds.time():
+        generator = pipeline(
+            text=[text],
+            voice=voice,
+            speed=speed,
+            split_pattern=r'\n+'
+        )
+        segments = [result.audio for result in generator if result.audio is not None]
+    if not segments:
+        raise ValueError("Generator returned None. Possible Kokoro failure.")
+    audio = torch.cat(segments).numpy()
+    metrics.chunk_audio_seconds.observe(len(audio) / SAMPLE_RATE)
+    return audio
+
+
+def stream_speech(text, voice="bf_emma", speed=1.0, model="kokoro", customwords=True, started=None):
+    '''
+        Yields the 16-bit PCM of a text chunk by chunk, each as soon as it is synthesized.
+        The text is prepared like an ingested book (prep_text, then the pronunciation lexicon)
+        and spoken by this process's warm pipeline. The first chunk is about a sentence long
+        so audio starts quickly. Chunks share the cache with the workers, so replaying a
+        preview after changing one word only synthesizes the chunk holding it.
+    '''
+    started = time.perf_counter() if started is None else started
+    text = normalizer.prep_text(text)
+    if customwords:
+        text = lexicons.get().apply(text)
+
+    pipeline = pipelines.for_voice(voice)
+    chunker = Chunker.for_lang_code(pipelines.lang_code_for_voice(voice))
+    first = True
+    for chunk in chunker.stream(text):
+        key = chunk_cache.key(chunk, voice=voice, speed=speed, model=f"{model}:{KOKORO_REPO_ID}", sample_rate=SAMPLE_RATE)
+        pcm = chunk_cache.fetch(key)
+        metrics.chunk_cache_lookups.inc(result="hit" if pcm is not None else "miss")
+        if pcm is None:
+            pcm = to_pcm16(synthesize_chunk(pipeline, chunk, voice, speed))
+            chunk_cache.store(key, pcm, SAMPLE_RATE)
+        if first:
+            metrics.stream_first_audio_seconds.observe(time.perf_counter() - started)
+            first = False
+        yield pcm
+
 
 class WAVGenerator:
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], job_id=None):
         required_keys = ["filename", "title", "author", "model"]
         for key in required_keys:
             if key not in config:
@@ -33,13 +177,37 @@ class WAVGenerator:
         self.subject = config.get("subject", "Unknown")
         self.creation_date = datetime.now().strftime("%Y-%m-%d")
         self.config = config
+        self.job_id = job_id  # progress is only published for jobs from the job store
+        self.retries = 0
 
         # Optional model config dict
         self.model_config = {
             "name": config.get("voice", "bf_emma"),  # Default voice
-            "sentence_chunk_length": config.get("sentence_chunk_length", 480)
+            # Chunk size in estimated phoneme tokens, sentence_chunk_length adds a character cap
+            "chunk_phonemes": int(config.get("chunk_phonemes", CHUNK_PHONEMES)),
+            "sentence_chunk_length": int(config["sentence_chunk_length"]) if config.get("sentence_chunk_length") else None,
+            "speed": float(config.get("speed", 1)),
+            # Chunks synthesized per dispatch, 1 keeps the sequential behaviour
+            "batch_size": max(1, int(config.get("batch_size", 1))),
+            "inference_workers": max(1, int(config.get("inference_workers", INFERENCE_WORKERS)))
         }
 
+        # Checked here so an unknown format or quality is refused at submit time
+        self.output_format, self.quality = output_options(config.get("output_format"), config.get("quality"))
+
+        self.chunker = Chunker.for_lang_code(
+            pipelines.lang_code_for_voice(self.model_config["name"]),
+            max_phonemes=self.model_config["chunk_phonemes"],
+            max_chars=self.model_config["sentence_chunk_length"]
+        )
+
+        # Private chunk directory, so concurrent tasks never share temp files
+        self.scratch = TaskScratch(self.file_path, self.model_config["name"])
+        # Chunk layout of the last finished render, re-renders after edits reuse its audio
+        self.record = RenderRecord(self.file_path, self.model_config["name"])
+        self.layout = []
+        self.previous = None
+
     def __repr__(self):
         return (
             f"<WAVGenerator(title={self.title!r}, author={self.author!r}, "
@@ -50,31 +218,25 @@ class WAVGenerator:
         with open(self.file_path, "r", encoding="utf-8") as file:
             return file.read()
 
-    def combine_sentences(self, sentences, length=480):
-        current_chunk = ""
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) + 1 > length:
-                yield current_chunk.strip()
-                current_chunk = sentence
-            else:
-                current_chunk += " " + sentence
-        if current_chunk:
-            yield current_chunk.strip()
-
-    def sent_tokenizer(self):
-        text = self.extract_text()
-        sentence_queue = []
-        tokenizer = PunktSentenceTokenizer()
-        sentences = tokenizer.tokenize(text)
-        sentences = [s for s in sentences if any(c.isalnum() for c in s)]
-
-        sentence_groups = list(self.combine_sentences(sentences, self.model_config["sentence_chunk_length"]))
-        for i, chunk in enumerate(sentence_groups):
-            if not chunk.strip():
-                continue
-            tempwav = f"temp_{i}.wav"
-            sentence_queue.append((chunk, tempwav))
-        return sentence_groups
+    def iter_chunks(self):
+        return self.chunker.chunks(self.extract_text())
+
+    @metrics.tokenize_seconds.timed()
+    def sent_tokenizer(self, previous=()):
+        '''
+            (chunk, unit hashes) pairs of the file, laid out along the previous render's chunks.
+        '''
+        return list(self.chunker.layout(self.extract_text(), previous))
+
+    def render_settings(self):
+        '''
+            Everything besides text and voice that changes the rendered audio.
+        '''
+        return {
+            "speed": self.model_config["speed"],
+            "model": f"{self.model}:{KOKORO_REPO_ID}",
+            "sample_rate": SAMPLE_RATE
+        }
 
     def apply_metadata(self, chapter_number: int):
         try:
@@ -89,159 +251,459 @@ class WAVGenerator:
             logger.info(f"Metadata applied to {self.file_path}")
         except Exception as e:
             logger.error(f"Error applying metadata to {self.file_path}: {e}")
-    def combine_temp_wavs(self, output_name):
+
+    def finalize_wav(self):
         """
-        Combines temp_N.wav files into a single output WAV file.
+        Moves the streamed narration into the audio folder, applies overlays and
+        encodes the deliverable to the task's output_format. Returns its path.
         """
-        logger.info("🔧 combine_temp_wavs started...")
-
-        temp_files = []
-        i = 0
-
-        while True:
-            temp_file = f"temp_{i}.wav"
-            if os.path.exists(temp_file):
-                logger.info(f"📁 Found: {temp_file}")
-                temp_files.append(temp_file)
-                i += 1
-            else:
-                logger.info(f"⛔ Stopped search — {temp_file} not found.")
-                break
-
-        if not temp_files:
-            logger.error("❌ No temp WAV files found to combine.")
-            return
-
         # Extract base name and keep part number if present
         base_filename = os.path.splitext(os.path.basename(self.file_path))[0]  # e.g., A_Name_in_the_Ashes_part_1
         output_filename = os.path.join("audio", f"{base_filename}.wav")
 
+        # Ensure output folder exists
+        os.makedirs(os.path.dirname(output_filename), exist_ok=True)
+        os.replace(self.scratch.output_path, output_filename)
+        logger.info(f"✅ Combined WAV saved as: {output_filename}")
+
+        # 🔊 Conditionally apply intro/outro overlay
+        deliverable = output_filename
+        if self.config.get("intro"):
+            try:
+                logger.info("🎧 Intro found — applying intro/outro overlays...")
+                with metrics.finalize_seconds.time(step="production"):
+                    deliverable = ProductionWav(wav_path=output_filename, config=self.config).output_path
+                logger.info("✅ Overlays applied successfully.")
+            except Exception as e:
+                logger.error(f"❌ Failed to apply overlays: {e}")
+        else:
+            logger.info("⚠️ No intro specified in config — skipping overlays.")
+
+        with metrics.finalize_seconds.time(step="encode"):
+            deliverable = encode(
+                deliverable,
+                self.output_format,
+                quality=self.quality,
+                keep_wav=parse_flag(self.config.get("keep_wav", False))
+            )
+
+        if self.layout:
+            try:
+                frames = [entry["frames"] for entry in self.scratch.chunks]
+                self.record.save(self.layout, frames, self.render_settings(), [output_filename, deliverable])
+            except Exception as e:
+                logger.warning(f"⚠️ Could not save the render record of {self.file_path}: {e}")
+
+        self.scratch.cleanup()
+        return deliverable
+
+class KokoroGenerator(WAVGenerator):
+    MAX_RETRIES = 3
+    RETRY_DELAY = 2  # seconds
+
+    def synthesize(self, pipeline, text):
+        return synthesize_chunk(pipeline, text, self.model_config.get("name", "bf_emma"), self.model_config["speed"])
+
+    def synthesize_batch(self, pipeline, texts, executor=None):
+        '''
+            Synthesizes a batch of chunks in one dispatch and returns their audio in order.
+            KModel only accepts a single sequence per forward pass, so the passes of a
+            batch run side by side on the executor and torch overlaps their kernels.
+            Phonemization is serialized by the pipeline's SerializedG2P.
+        '''
+        if executor is None or len(texts) == 1:
+            return [self.synthesize(pipeline, text) for text in texts]
+        return list(executor.map(lambda text: self.synthesize(pipeline, text), texts))
+
+    def batch_chunks(self, indexed_chunks):
+        '''
+            Groups (idx, text) pairs into batches of similar length.
+            Sorting only happens inside a small window so the render stays close to reading order.
+        '''
+        size = self.model_config["batch_size"]
+        if size <= 1:
+            for item in indexed_chunks:
+                yield [item]
+            return
+
+        window = size * 4
+        for start in range(0, len(indexed_chunks), window):
+            group = sorted(indexed_chunks[start:start + window], key=lambda item: len(item[1]))
+            for i in range(0, len(group), size):
+                yield group[i:i + size]
+
+    def cache_key(self, text):
+        return chunk_cache.key(text, voice=self.model_config["name"], **self.render_settings())
+
+    def generate_chunk(self, pipeline, idx, text):
+        retry_count = 0
+        while retry_count < self.MAX_RETRIES:
+            try:
+                logger.info(f"🎙️ Attempting to generate chunk {idx} (try {retry_count + 1})")
+                return self.synthesize(pipeline, text)
+
+            except Exception as e:
+                logger.warning(f"⚠️ Chunk {idx} generation failed on attempt {retry_count + 1}: {e}")
+                retry_count += 1
+                self.retries += 1
+                metrics.chunk_retries.inc(kind="chunk")
+                time.sleep(self.RETRY_DELAY)
+
+        logger.error(f"❌ Failed to generate chunk {idx} after {self.MAX_RETRIES} retries.")
+        raise RuntimeError(f"Aborting: chunk {idx} could not be generated.")
+
+    def lookup(self, text):
+        '''
+            Audio of a chunk that needs no synthesis, from the cache or the previous render of the file.
+        '''
+        pcm = chunk_cache.fetch(self.cache_key(text))
+        metrics.chunk_cache_lookups.inc(result="hit" if pcm is not None else "miss")
+        if pcm is None and self.previous is not None:
+            pcm = self.previous.read(text)
+            if pcm is not None:
+                metrics.chunks_reused.inc()
+        return pcm
+
+    def render_batches(self, pending):
+        pipeline = pipelines.for_voice(self.model_config.get("name", "bf_emma"))
+        batch_size = self.model_config["batch_size"]
+        executor = None
+        if batch_size > 1:
+            # The passes of a batch split the cores instead of each asking for all of them
+            threads = max(1, torch.get_num_threads() // batch_size)
+            executor = ThreadPoolExecutor(max_workers=batch_size, initializer=torch.set_num_threads, initargs=(threads,))
         try:
-            with wave.open(temp_files[0], 'rb') as wf:
-                ref_params = wf.getparams()
-                frames = [wf.readframes(wf.getnframes())]
-
-            for temp_file in temp_files[1:]:
-                with wave.open(temp_file, 'rb') as wf:
-                    params = wf.getparams()
-                    if (
-                        params.nchannels != ref_params.nchannels or
-                        params.sampwidth != ref_params.sampwidth or
-                        params.framerate != ref_params.framerate or
-                        params.comptype != ref_params.comptype or
-                        params.compname != ref_params.compname
-                    ):
-                        logger.error(f"❌ Format mismatch in {temp_file}")
-                        logger.error(f"Expected format: {ref_params}")
-                        logger.error(f"Found format:    {params}")
-                        return
-
-                    frames.append(wf.readframes(wf.getnframes()))
-
-            # Ensure output folder exists
-            os.makedirs(os.path.dirname(output_filename), exist_ok=True)
-
-            with wave.open(output_filename, 'wb') as wf:
-                wf.setparams(ref_params)
-                for f in frames:
-                    wf.writeframes(f)
-
-            logger.info(f"✅ Combined WAV saved as: {output_filename}")
-
-            # 🔊 Conditionally apply intro/outro overlay
-            if self.config.get("intro"):
-                try:
-                    logger.info("🎧 Intro found — applying intro/outro overlays...")
-                    ProductionWav(wav_path=output_filename, config=self.config)
-                    logger.info("✅ Overlays applied successfully.")
-                except Exception as e:
-                    logger.error(f"❌ Failed to apply overlays: {e}")
+            for batch in self.batch_chunks(pending):
+                yield self.render_batch(pipeline, batch, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def render_in_pool(self, pending, workers):
+        '''
+            Yields {idx: pcm} for (idx, text) pairs in order, synthesizing on a pool of inference
+            processes that each hold a warm pipeline and retry their chunks like generate_chunk.
+            Cache and previous-render lookups stay in this process. At most two chunks per
+            process are in flight or waiting for an earlier one, so memory does not grow with
+            the file.
+        '''
+        threads = max(1, torch.get_num_threads() // workers)
+        logger.info(f"🧵 Synthesizing on {workers} inference processes with {threads} torch thread(s) each")
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=start_inference_worker,
+            initargs=(self.config, threads)
+        )
+        window = deque()
+        try:
+            for idx, text in pending:
+                pcm = self.lookup(text)
+                future = pool.submit(synthesize_in_worker, idx, text) if pcm is None else None
+                window.append((idx, text, pcm, future))
+                if len(window) >= workers * 2:
+                    yield self.collect(*window.popleft())
+            while window:
+                yield self.collect(*window.popleft())
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def collect(self, idx, text, pcm, future):
+        if future is not None:
+            # Raises the chunk's error once the inference process gave up on it
+            pcm, retries = future.result()
+            self.retries += retries
+            chunk_cache.store(self.cache_key(text), pcm, SAMPLE_RATE)
+        return {idx: pcm}
+
+    def render_batch(self, pipeline, batch, executor=None):
+        '''
+            Returns {idx: pcm} for a batch of (idx, text) pairs.
+            Chunks are taken from the cache or the previous render of the file,
+            the rest are synthesized and added to the cache.
+        '''
+        rendered = {}
+        todo = []
+        for idx, text in batch:
+            pcm = self.lookup(text)
+            if pcm is not None:
+                rendered[idx] = pcm
             else:
-                logger.info("⚠️ No intro specified in config — skipping overlays.")
-                
-            for f in temp_files:
-                os.remove(f)
-
-        except Exception as e:
-            logger.error(f"❌ Failed to combine WAV files: {e}")
-            raise e
+                todo.append((idx, text))
+
+        audios = {}
+        if len(todo) > 1:
+            try:
+                logger.info(f"🎙️ Generating batch of chunks {[idx for idx, _ in todo]}")
+                results = self.synthesize_batch(pipeline, [text for _, text in todo], executor)
+                audios = {idx: audio for (idx, _), audio in zip(todo, results)}
+            except Exception as e:
+                logger.warning(f"⚠️ Batch generation failed, retrying its chunks one by one: {e}")
+                self.retries += 1
+                metrics.chunk_retries.inc(kind="batch")
+
+        # Single chunks and failed batches keep the per-chunk retry semantics
+        for idx, text in todo:
+            audio = audios.get(idx)
+            if audio is None:
+                audio = self.generate_chunk(pipeline, idx, text)
+            rendered[idx] = to_pcm16(audio)
+            chunk_cache.store(self.cache_key(text), rendered[idx], SAMPLE_RATE)
+        return rendered
 
-class KokoroGenerator(WAVGenerator):
     def generate_wav(self):
-        import time
-
-        MAX_RETRIES = 3
-        RETRY_DELAY = 2  # seconds
-        pipeline = KPipeline(lang_code='a')
-        chunks = self.sent_tokenizer()
+        self.layout = self.sent_tokenizer(self.record.layout())
+        chunks = [chunk for chunk, _ in self.layout]
         expected_count = len(chunks)
         logger.info(f"🧠 Tokenized into {expected_count} chunks.")
 
-        for idx, text in enumerate(chunks):
-            temp_filename = f"temp_{idx}.wav"
-            if os.path.exists(temp_filename):
-                logger.info(f"⏩ Skipping {temp_filename}, already exists.")
-                continue
-
-            retry_count = 0
-            while retry_count < MAX_RETRIES:
-                try:
-                    logger.info(f"🎙️ Attempting to generate chunk {idx} (try {retry_count + 1})")
-                    generator = pipeline(
-                        text=[text],
-                        voice=self.model_config.get("name", "bf_emma"),
-                        speed=1,
-                        split_pattern=r'\n+'
-                    )
-
-                    result = next(generator, None)
-                    if result is None:
-                        raise ValueError("Generator returned None. Possible Kokoro failure.")
-
-                    gs, ps, audio = result
-                    sf.write(temp_filename, audio, 24000, format='WAV', subtype='PCM_16')
-                    logger.info(f"✅ Successfully wrote {temp_filename}")
-                    break  # success, exit retry loop
-
-                except Exception as e:
-                    logger.warning(f"⚠️ Chunk {idx} generation failed on attempt {retry_count + 1}: {e}")
-                    retry_count += 1
-                    time.sleep(RETRY_DELAY)
-
-            if not os.path.exists(temp_filename):
-                logger.error(f"❌ Failed to generate chunk {idx} after {MAX_RETRIES} retries.")
-                raise RuntimeError(f"Aborting: chunk {idx} could not be generated.")
-
-        # ✅ Confirm all temp files exist before combining
-        missing_files = [f"temp_{i}.wav" for i in range(expected_count) if not os.path.exists(f"temp_{i}.wav")]
-        if missing_files:
-            logger.error("❌ Some temp WAV files are still missing after retries:")
-            for f in missing_files:
-                logger.error(f" - {f}")
+        self.previous = self.record.reader(self.render_settings())
+        if self.previous is not None:
+            unchanged = sum(1 for chunk in chunks if text_hash(chunk) in self.previous.spans)
+            logger.info(f"♻️ {unchanged}/{expected_count} chunks are unchanged since the last render of this file.")
+
+        self.scratch.open(chunks)
+        pending = [(idx, text) for idx, text in enumerate(chunks) if not self.scratch.is_done(idx)]
+        next_idx = pending[0][0] if pending else expected_count
+
+        # Starting the inference processes only pays off with a few chunks for each of them
+        workers = self.model_config["inference_workers"]
+        if workers > 1 and len(pending) >= workers * 2 and not mp.current_process().daemon:
+            results = self.render_in_pool(pending, workers)
+        else:
+            results = self.render_batches(pending)
+
+        writer = WavStreamWriter(self.scratch.output_path, SAMPLE_RATE, resume_frames=self.scratch.resume_frames())
+        progress = ProgressReporter(jobs, self.job_id, expected_count, next_idx, writer.duration)
+        progress.update(next_idx, writer.duration, force=True)
+        resumed_audio = writer.duration
+        render_started = time.perf_counter()
+        ready = {}
+        try:
+            for rendered in results:
+                ready.update(rendered)
+
+                # Append everything that is next in reading order, batches may finish out of order
+                while next_idx in ready:
+                    pcm = ready.pop(next_idx)
+                    writer.write(pcm)
+                    # Data hits the file before the manifest claims it, so resume never over-reads
+                    writer.flush()
+                    self.scratch.mark_done(next_idx, len(pcm) // writer.block_align)
+                    logger.info(f"✅ Appended chunk {next_idx} ({writer.duration:.1f}s assembled)")
+                    next_idx += 1
+                    progress.update(next_idx, writer.duration, self.retries)
+        finally:
+            results.close()
+            writer.close()
+            if self.previous is not None:
+                self.previous.close()
+                self.previous = None
+
+        if writer.duration > resumed_audio:
+            metrics.job_rtf.observe((time.perf_counter() - render_started) / (writer.duration - resumed_audio))
+
+        cache_stats = chunk_cache.stats()
+        logger.info(f"💾 Chunk cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses this process.")
+
+        # ✅ Confirm every chunk is assembled before finalizing
+        missing_chunks = self.scratch.missing()
+        if missing_chunks:
+            logger.error(f"❌ Chunks still missing after retries: {missing_chunks}")
             raise RuntimeError("TTS generation incomplete. Cannot proceed with combining.")
 
-        self.combine_temp_wavs(output_name=self.title.replace(" ", "_"))
+        progress.update(next_idx, writer.duration, self.retries, stage="finalizing", force=True)
+        final_path = self.finalize_wav()
+        progress.update(next_idx, writer.duration, self.retries, stage="done", force=True)
+        return final_path
 
 
         #self.apply_metadata(chapter_number=1)
 
 
-def process_queue(task_queue):
-    while True:
-        tts_task = task_queue.get()
+# The task an inference process synthesizes for, see KokoroGenerator.render_in_pool
+inference_task = None
+
+
+def start_inference_worker(config, torch_threads):
+    global inference_task
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+    inference_task = KokoroGenerator(config)
+    pipelines.for_voice(inference_task.model_config["name"])
+
+
+def synthesize_in_worker(idx, text):
+    '''
+        Renders one chunk with generate_chunk's retries, returns its PCM and the retries it took.
+    '''
+    retries = inference_task.retries
+    try:
+        audio = inference_task.generate_chunk(pipelines.for_voice(inference_task.model_config["name"]), idx, text)
+        return to_pcm16(audio), inference_task.retries - retries
+    finally:
+        # Pool processes exit without running atexit, so their metrics are written as they go
+        metrics.registry.flush()
+
+
+def worker_main(worker_name, torch_threads, stop, poll_interval):
+    '''
+        Entry point of a pool worker process. Pins torch to its share of the cores,
+        then claims and renders jobs from the job store until stop is set.
+    '''
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+    logger.info(f"👷 Worker {worker_name} started (pid {os.getpid()}, {torch_threads} torch threads)")
+
+    while not stop.is_set():
+        job = jobs.claim(worker_name, scheduler.choose, key=job_task_key)
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+
+        file_path = job["config"].get("filename")
+        metrics.queue_wait_seconds.observe(max(0.0, job["started_at"] - job["created_at"]), kind=job["kind"])
+        busy_since = time.perf_counter()
+        rendering = Event()
+        Thread(target=send_heartbeats, args=(job["id"], rendering), daemon=True).start()
         try:
-            logger.info(f"Processing task for file: {tts_task.file_path}")
-            tts_task.generate_wav()
+            logger.info(f"Worker {worker_name} processing {job['kind']} job {job['id']} for file: {file_path}")
+            output_path = run_job(job)
+            jobs.complete(job["id"], output_path)
+            metrics.jobs_finished.inc(result="done", kind=job["kind"])
         except Exception as e:
-            logger.error(f"Error processing task for file '{tts_task.file_path}': {e}")
+            logger.error(f"Error processing job {job['id']} for file '{file_path}': {e}")
+            jobs.fail(job["id"], e)
+            metrics.jobs_finished.inc(result="failed", kind=job["kind"])
         finally:
-            task_queue.task_done()
-
-
-# Initialize the task queue
-tts_queue = Queue()
+            rendering.set()
+            metrics.worker_busy_seconds.inc(time.perf_counter() - busy_since, worker=worker_name)
+
+    logger.info(f"👋 Worker {worker_name} stopped")
+
+
+def run_job(job):
+    '''
+        Does the work of a claimed job and returns the path of its output.
+    '''
+    config = job["config"]
+    if job["kind"] == "ingest":
+        processor = TextIn(
+            source=config["filename"],
+            start=int(config.get("start", 1)),
+            end=int(config.get("end", 999)),
+            skiplinks=config.get("skiplinks", True),
+            debug=False,
+            title=config.get("title", ""),
+            author=config.get("author", ""),
+            chapters_per_file=int(config.get("chapters_per_file", 1)),
+            customwords=config.get("customwords", "custom_words.txt"),
+            intro=config.get("intro", ""),
+            outtro=config.get("outtro", ""),
+            job_id=job["id"],
+            lazy=config.get("lazy", True)  # bounded memory for any size of book
+        )
+        return processor.clean_text_dir
+    return KokoroGenerator(config, job_id=job["id"]).generate_wav()
+
+
+def job_task_key(job):
+    '''
+        The scratch directory a job renders in, two jobs for the same file and voice would share it.
+    '''
+    if job["kind"] != "tts":
+        return None
+    return task_key(job["config"]["filename"], job["config"].get("voice", "bf_emma"))
+
+
+def send_heartbeats(job_id, finished):
+    while not finished.wait(HEARTBEAT_INTERVAL):
+        jobs.heartbeat(job_id)
+
+
+class WorkerPool:
+    '''
+    Pool of worker processes that claim jobs from the SQLite job store.
+    Jobs interrupted by a crash or restart are requeued by the monitor, right away
+    when one of its own workers dies and otherwise once their heartbeat goes stale.
+    Pool size and per-worker torch threads come from TTS_WORKERS and TTS_TORCH_THREADS.
+    '''
+    POLL_INTERVAL = 1.0  # seconds an idle worker waits before looking for new jobs
+    WORKER_ENV = "TTS_POOL_STARTED"
+
+    def __init__(self, size=None, torch_threads=None):
+        self.size = max(1, int(size or os.environ.get("TTS_WORKERS", 1)))
+        # Split the cores between workers so their intra-op pools don't oversubscribe
+        default_threads = max(1, (os.cpu_count() or 1) // self.size)
+        self.torch_threads = max(1, int(torch_threads or os.environ.get("TTS_TORCH_THREADS", default_threads)))
+
+        self._ctx = mp.get_context("spawn")
+        self._stop = None
+        self._processes = {}
+        self._started = False
+        self._stopping = False
+
+    def start(self):
+        # Spawned workers re-import the app's main module before mp.parent_process() is set,
+        # so they are recognised by the marker they inherit from the environment
+        if self._started or os.environ.get(self.WORKER_ENV):
+            return
+        self._started = True
+        os.environ[self.WORKER_ENV] = "1"
+        metrics.registry.reset()
+        self._stop = self._ctx.Event()
+        jobs.recover()
+
+        for worker_id in range(self.size):
+            self._spawn(worker_id)
+
+        Thread(target=self._monitor, name="tts-monitor", daemon=True).start()
+        atexit.register(self.shutdown)
+        logger.info(f"🏭 Started {self.size} TTS worker(s) with {self.torch_threads} torch thread(s) each")
+
+    def worker_name(self, worker_id):
+        # Unique across restarts and app processes sharing the job store
+        return f"{os.getpid()}-{worker_id}"
+
+    def _spawn(self, worker_id):
+        process = self._ctx.Process(
+            target=worker_main,
+            args=(self.worker_name(worker_id), self.torch_threads, self._stop, self.POLL_INTERVAL),
+            name=f"tts-worker-{worker_id}"
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def _monitor(self):
+        while not self._stop.wait(5):
+            self._reap()
+            # Also picks up jobs of app processes that are gone, e.g. before a container restart
+            jobs.recover()
+
+    def _reap(self):
+        '''
+            Replaces workers that died without finishing their job, e.g. killed by the OOM killer.
+        '''
+        for worker_id, process in list(self._processes.items()):
+            if process.is_alive() or self._stopping:
+                continue
+            logger.error(f"❌ Worker {worker_id} exited with code {process.exitcode}, restarting it")
+            jobs.recover(worker=self.worker_name(worker_id))
+            self._spawn(worker_id)
 
-# Start the worker thread to process tasks from the queue
-worker_thread = Thread(target=process_queue, args=(tts_queue,))
-worker_thread.daemon = True
-worker_thread.start()
\ No newline at end of file
+    def shutdown(self, timeout=10):
+        if not self._started or self._stopping:
+            return
+        self._stopping = True
+        self._stop.set()
+        for worker_id, process in self._processes.items():
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"⚠️ Worker {worker_id} did not stop in time, terminating it")
+                process.terminate()
+                jobs.recover(worker=self.worker_name(worker_id))
+        logger.info("🏭 TTS worker pool shut down")
+
+
+# Worker processes are started by the app, see WorkerPool.start
+worker_pool = WorkerPool()